@@ -0,0 +1,149 @@
+import copy
+import itertools
+
+class StandInConnection:
+    '''
+    A stand-in for a pyArango connection, holding StandInDatabases by name.
+    '''
+    def __init__(self):
+        self.databases = {}
+
+    def hasDatabase(self, name):
+        return name in self.databases
+
+    def createDatabase(self, name):
+        self.databases[name] = StandInDatabase()
+        return self.databases[name]
+
+    def __getitem__(self, name):
+        return self.databases[name]
+
+
+class StandInCollection:
+    '''
+    A collection of the StandInDatabase: its name and its documents, in insertion order.
+    '''
+    def __init__(self, db, name, className='Collection'):
+        self.db = db
+        self.name = name
+        self.className = className
+        self.documents = []
+
+    def createDocument(self, initDict=None):
+        return StandInDocument(self, initDict)
+
+
+class StandInDocument(dict):
+    '''
+    A document that is added to its collection when saved, as ArangoDBGraphCreator adds nodes and edges.
+    '''
+    def __init__(self, collection, initDict=None):
+        super().__init__(initDict or {})
+        self.collection = collection
+
+    def save(self):
+        self.collection.db.insert(self.collection.name, dict(self))
+
+
+class StandInDatabase:
+    '''
+    An in-memory stand-in for a pyArango database, for checking ArangoDBGraphCreator and
+    ArangoDBGraphVerifier without an ArangoDB server (see the verify-arango and
+    arango-closure benchmarks).
+
+    It supports creating collections and exactly the AQL queries those classes run, and
+    raises UnsupportedQuery for any other query. Results are returned as lists rather than
+    cursors, and requests counts the batches a server would have sent or received.
+    '''
+    class UnsupportedQuery(Exception):
+        pass
+
+    def __init__(self):
+        self.collections = {}
+        self.requests = 0
+        self.keys = itertools.count()
+
+    def hasCollection(self, name):
+        return name in self.collections
+
+    def createCollection(self, name, className='Collection'):
+        self.collections[name] = StandInCollection(self, name, className)
+        return self.collections[name]
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def insert(self, collection_name, doc):
+        '''
+        Adds a copy of a document, with a _key (unless it has one), _id and _rev as ArangoDB sets them.
+        '''
+        if collection_name not in self.collections:
+            self.createCollection(collection_name)
+        doc = copy.deepcopy(doc)
+        doc.setdefault('_key', str(next(self.keys)))
+        doc['_id'] = f"{collection_name}/{doc['_key']}"
+        doc['_rev'] = '1'
+        self.collections[collection_name].documents.append(doc)
+
+    def load_parsed(self, xml_parser, sense_id_col_name='sense_ids', lex_entry_col_name='lex_entries', \
+        synset_col_name='synsets', syntactic_behaviour_col_name='syntactic_behaviours', edge_col_name='edges'):
+        '''
+        Loads the nodes and edges of a WordNetXMLParser into the collections that
+        ArangoDBGraphCreator.create_nodes_and_edges creates.
+        '''
+        relation_type_collection_map = {
+            'synset_to_synset' : (synset_col_name, synset_col_name),
+            'sense_to_sense' : (sense_id_col_name, sense_id_col_name),
+            'sense_to_verb_subcat' : (sense_id_col_name, syntactic_behaviour_col_name),
+            'sense_to_lex_entry' : (sense_id_col_name, lex_entry_col_name),
+            'sense_to_synset' : (sense_id_col_name, synset_col_name)
+            }
+        for collection_name, nodes in ((sense_id_col_name, xml_parser.sense_id_dict), \
+            (lex_entry_col_name, xml_parser.lex_entry_dict), (synset_col_name, xml_parser.synset_dict), \
+            (syntactic_behaviour_col_name, xml_parser.syntactic_behaviour_dict)):
+            self.createCollection(collection_name)
+            for key, attributes in nodes.items():
+                self.insert(collection_name, {'_key': key, **attributes})
+        self.createCollection(edge_col_name, className='Edges')
+        for edge in xml_parser.edge_list:
+            from_collection, to_collection = relation_type_collection_map[edge['relCategory']]
+            self.insert(edge_col_name, {'_from': f"{from_collection}/{edge['_from']}", \
+                '_to': f"{to_collection}/{edge['_to']}", '_type': edge['_type']})
+
+    def AQLQuery(self, query, rawResults=False, batchSize=100, bindVars=None):
+        bindVars = bindVars or {}
+        docs = self.collections[bindVars['@collection']].documents
+        if query == 'RETURN LENGTH(@@collection)':
+            results = [len(docs)]
+        elif query == 'FOR e IN @@collection COLLECT type = e._type WITH COUNT INTO n RETURN [type, n]':
+            counts = {}
+            for doc in docs:
+                counts[doc['_type']] = counts.get(doc['_type'], 0) + 1
+            results = [[edge_type, n] for edge_type, n in counts.items()]
+        elif query == 'FOR d IN @@collection RETURN UNSET(d, "_id", "_rev")':
+            results = [unset(doc, '_id', '_rev') for doc in docs]
+        elif query == 'FOR d IN @@collection FILTER d._key IN @keys RETURN UNSET(d, "_id", "_rev")':
+            keys = set(bindVars['keys'])
+            results = [unset(doc, '_id', '_rev') for doc in docs if doc['_key'] in keys]
+        elif query == 'FOR e IN @@collection RETURN UNSET(e, "_id", "_rev", "_key")':
+            results = [unset(doc, '_id', '_rev', '_key') for doc in docs]
+        elif query == 'FOR e IN @@collection FILTER e._from IN @keys RETURN UNSET(e, "_id", "_rev", "_key")':
+            keys = set(bindVars['keys'])
+            results = [unset(doc, '_id', '_rev', '_key') for doc in docs if doc['_from'] in keys]
+        elif query == 'FOR d IN @docs INSERT d INTO @@collection':
+            for doc in bindVars['docs']:
+                self.insert(bindVars['@collection'], doc)
+            results = []
+        elif query == 'FOR d IN @docs UPDATE d IN @@collection':
+            by_key = {doc['_key']: doc for doc in docs}
+            for doc in bindVars['docs']:
+                by_key[doc['_key']].update(copy.deepcopy(doc))
+            results = []
+        else:
+            raise StandInDatabase.UnsupportedQuery(query)
+        self.requests += max(1, -(-len(results) // batchSize))
+        return results
+
+
+def unset(doc, *attributes):
+    return {attribute: value for attribute, value in doc.items() if attribute not in attributes}
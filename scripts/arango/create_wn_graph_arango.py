@@ -1,6 +1,11 @@
-from pyArango.connection import *
-from pyArango.collection import Collection, Edges
-from arango_connect import connect_to_arangodb
+from __future__ import annotations
+try:
+    from pyArango.connection import *
+    from pyArango.collection import Collection, Edges
+    from arango_connect import connect_to_arangodb
+except ImportError:
+    # pyArango is only needed to connect to a server, not to fill a stand-in database
+    connect_to_arangodb = None
 from parse_xml import WordNetXMLParser
 from datetime import datetime
 
@@ -8,13 +13,19 @@ class ArangoDBGraphCreator:
     class UnexpectedRelationType(Exception):
         pass
 
-    def __init__(self, db_name='wordnet_db', connection=connect_to_arangodb()):
+    insert_query = 'FOR d IN @docs INSERT d INTO @@collection'
+    update_query = 'FOR d IN @docs UPDATE d IN @@collection'
+
+    def __init__(self, db_name='wordnet_db', connection=None):
+        # Connect when the graph is created rather than when this module is imported
         self.connection = connection
         self.db_name = db_name
 
-    def create_ArangoDB_WordNet_from_XML(self, xml_filepath='wn.xml',written_form_in_sense_id=True, pos_in_sense_id=True):
+    def create_ArangoDB_WordNet_from_XML(self, xml_filepath='wn.xml',written_form_in_sense_id=True, pos_in_sense_id=True, \
+        hypernym_closure=False):
         '''
         Main function that creates the WordNet graph's collections in ArangoDB from XML filepath.
+        With hypernym_closure, also adds the closure of the hypernym relations (see add_hypernym_closure).
         '''
         print(f'{datetime.now()}: Starting process, creating db and collections')
         self.initiate_db_and_collections()
@@ -24,6 +35,9 @@ class ArangoDBGraphCreator:
         self.parse_xml(xml_filepath,written_form_in_sense_id, pos_in_sense_id)
         print(f'{datetime.now()}: Parsed XML, creating nodes and edges in ArangoDB')
         self.create_nodes_and_edges()
+        if hypernym_closure:
+            print(f'{datetime.now()}: Nodes and edges in ArangoDB, adding the hypernym closure')
+            self.add_hypernym_closure()
         print(f'{datetime.now()}: Nodes and edges in ArangoDB, Process Complete')
 
     def initiate_db_and_collections(self, sense_id_col_name='sense_ids', \
@@ -33,6 +47,8 @@ class ArangoDBGraphCreator:
             Checks if the db and collections exist, creates them if they don't.
             Associates the db and collections objects with the GraphCreator.
             '''
+            if self.connection is None:
+                self.connection = connect_to_arangodb()
             self.db = self.get_db(self.connection, self.db_name)
             self.sense_id_collection = self.get_collection(self.db, sense_id_col_name)
             self.lex_entry_collection = self.get_collection(self.db, lex_entry_col_name)
@@ -80,6 +96,35 @@ class ArangoDBGraphCreator:
         print(f'{datetime.now()}: Done, adding items to edge_collection in ArangoDB')
         self.add_edges_to_collection(self.edge_collection, self.xml_parser.edge_list, self.relation_type_collection_map)
 
+    def add_hypernym_closure(self, closure_col_name='hypernym_closure', batch_size=10000):
+        '''
+        Computes the transitive closure of the hypernym and instance_hypernym relations in Python
+        (WordNetXMLParser.hypernym_closure) and loads it in bulk:
+        1. An edge from each synset to each of its ancestors, with the depth of the ancestor above
+           it, in the closure_col_name edge collection. All ancestors of a synset are then a lookup
+           in the edge index: FOR e IN hypernym_closure FILTER e._from == @synset RETURN e._to
+        2. The hypernym paths from a root down to each synset, as the hypernymPaths array on the
+           synset documents.
+        '''
+        closure, paths = self.xml_parser.hypernym_closure()
+        synsets = self.synset_collection.name
+        self.closure_collection = self.get_edge_collection(self.db, closure_col_name)
+        print(f'{datetime.now()}: adding {len(closure)} edges to {closure_col_name} in ArangoDB')
+        self.bulk_query(self.insert_query, self.closure_collection.name, [
+            {'_from': f"{synsets}/{edge['_from']}", '_to': f"{synsets}/{edge['_to']}", \
+                '_type': edge['_type'], 'depth': edge['depth']} for edge in closure], batch_size)
+        print(f'{datetime.now()}: Done, adding hypernym paths to {synsets} in ArangoDB')
+        self.bulk_query(self.update_query, synsets, [
+            {'_key': key, 'hypernymPaths': synset_paths} for key, synset_paths in paths.items()], batch_size)
+
+    def bulk_query(self, aql, collection_name, docs, batch_size):
+        '''
+        Runs an AQL query over the documents in batches of batch_size, with one request per batch.
+        '''
+        for i in range(0, len(docs), batch_size):
+            self.db.AQLQuery(aql, rawResults=True, batchSize=batch_size, \
+                bindVars={'@collection': collection_name, 'docs': docs[i:i + batch_size]})
+
     def get_db(self,conn:Connection, db_name):
         '''
         Input connection and db_name. Creates a new DB if doesn't exist, returns the db object.
@@ -214,6 +214,58 @@ class WordNetXMLParser:
         # RelCategory is used when making the edge collection to append the collection name with the key.
         self.edge_list.append({'relCategory': relCategory, '_from': source, '_to': self.replace_disallowed_chars(target), '_type': relType})
 
+    def hypernym_closure(self, rel_types=('hypernym', 'instance_hypernym')):
+        '''
+        Computes the transitive closure of the hypernym and instance_hypernym edges between
+        synsets, so that all ancestors of a synset can be looked up without a traversal.
+        Returns a list of closure edges, dicts with _from, _to (synset keys), _type 'ancestor'
+        and depth, the length of the shortest chain of hypernyms between them, and a dict from each synset
+        to its hypernym paths, the lists of synset keys from a root down to the synset.
+        Hypernym loops are ignored.
+        '''
+        parents = {}
+        for edge in self.edge_list:
+            if edge['relCategory'] == 'synset_to_synset' and edge['_type'] in rel_types \
+                and edge['_to'] in self.synset_dict:
+                parents.setdefault(edge['_from'], [])
+                if edge['_to'] not in parents[edge['_from']]:
+                    parents[edge['_from']].append(edge['_to'])
+
+        closure = []
+        for synset_id in self.synset_dict:
+            # Breadth first up from the synset, so each ancestor is found at its shortest depth
+            depths = {synset_id: 0}
+            frontier = [synset_id]
+            while frontier:
+                next_frontier = []
+                for node in frontier:
+                    for parent in parents.get(node, []):
+                        if parent not in depths:
+                            depths[parent] = depths[node] + 1
+                            next_frontier.append(parent)
+                            closure.append({'_from': synset_id, '_to': parent, '_type': 'ancestor', \
+                                'depth': depths[parent]})
+                frontier = next_frontier
+
+        paths = {}
+        for synset_id in self.synset_dict:
+            # Depth first, computing the paths of the parents of a synset before its own
+            stack = [(synset_id, ())]
+            while stack:
+                node, visiting = stack[-1]
+                if node in paths:
+                    stack.pop()
+                    continue
+                pending = [p for p in parents.get(node, []) if p not in paths and p not in visiting]
+                if pending:
+                    stack.extend((p, visiting + (node,)) for p in pending)
+                    continue
+                stack.pop()
+                node_paths = [path + [node] for p in parents.get(node, []) if p in paths \
+                    and p not in visiting for path in paths[p] if node not in path]
+                paths[node] = node_paths or [[node]]
+        return closure, paths
+
     def print_all(self):
         # for debugging
         print(self.wordnet_set_info)
@@ -0,0 +1,243 @@
+try:
+    from arango_connect import connect_to_arangodb
+except ImportError:
+    # pyArango is only needed to connect to a server, not to verify a stand-in database
+    connect_to_arangodb = None
+from parse_xml import WordNetXMLParser
+from collections import Counter
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import sys
+
+class ArangoDBGraphVerifier:
+    '''
+    Verifies a WordNet graph created by ArangoDBGraphCreator against the output of
+    WordNetXMLParser for the same XML file, without pulling the graph back one document
+    at a time.
+
+    1. Counts the documents in each collection, and the edges of each _type.
+    2. Compares digests of the documents of each collection. Documents are fetched with
+       AQL cursors in large batches, and either all documents are compared or a sample
+       chosen by a hash of the node key (or of the edge's _from), so the same sample is
+       taken from the XML and the database.
+
+    Only db.AQLQuery is used, so any database object (such as a local stand-in server in
+    tests) that answers the queries below can be verified.
+    '''
+    count_query = 'RETURN LENGTH(@@collection)'
+    type_count_query = 'FOR e IN @@collection COLLECT type = e._type WITH COUNT INTO n RETURN [type, n]'
+    node_query = 'FOR d IN @@collection RETURN UNSET(d, "_id", "_rev")'
+    node_sample_query = 'FOR d IN @@collection FILTER d._key IN @keys RETURN UNSET(d, "_id", "_rev")'
+    edge_query = 'FOR e IN @@collection RETURN UNSET(e, "_id", "_rev", "_key")'
+    edge_sample_query = 'FOR e IN @@collection FILTER e._from IN @keys RETURN UNSET(e, "_id", "_rev", "_key")'
+
+    def __init__(self, db_name='wordnet_db', connection=None, batch_size=10000, \
+        sample_rate=1.0, max_ids=20):
+        self.connection = connection
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.max_ids = max_ids
+        self.mismatches = []
+
+    def verify_ArangoDB_WordNet_against_XML(self, xml_filepath='wn.xml', written_form_in_sense_id=True, \
+        pos_in_sense_id=True, db=None, sense_id_col_name='sense_ids', lex_entry_col_name='lex_entries', \
+        synset_col_name='synsets', syntactic_behaviour_col_name='syntactic_behaviours', edge_col_name='edges', \
+        hypernym_closure=False, closure_col_name='hypernym_closure'):
+        '''
+        Main function that verifies the collections in ArangoDB against the XML filepath.
+        Uses the same collection names as ArangoDBGraphCreator by default.
+        With hypernym_closure, also verifies the closure edges and hypernym paths added by
+        ArangoDBGraphCreator.add_hypernym_closure.
+        Returns the list of mismatches, which is empty if the graph is correct.
+        '''
+        if db is None:
+            if self.connection is None:
+                self.connection = connect_to_arangodb()
+            db = self.connection[self.db_name]
+        self.db = db
+        print(f'{datetime.now()}: Parsing XML')
+        xml_parser = WordNetXMLParser(xml_filepath, written_form_in_sense_id, pos_in_sense_id)
+        xml_parser.parse()
+        relation_type_collection_map = {
+            'synset_to_synset' : (synset_col_name, synset_col_name),
+            'sense_to_sense' : (sense_id_col_name, sense_id_col_name),
+            'sense_to_verb_subcat' : (sense_id_col_name, syntactic_behaviour_col_name),
+            'sense_to_lex_entry' : (sense_id_col_name, lex_entry_col_name),
+            'sense_to_synset' : (sense_id_col_name, synset_col_name)
+            }
+        synsets = xml_parser.synset_dict
+        if hypernym_closure:
+            closure, paths = xml_parser.hypernym_closure()
+            synsets = {key: {**attributes, 'hypernymPaths': paths[key]} for key, attributes in synsets.items()}
+        for collection_name, nodes in ((sense_id_col_name, xml_parser.sense_id_dict), \
+            (lex_entry_col_name, xml_parser.lex_entry_dict), (synset_col_name, synsets), \
+            (syntactic_behaviour_col_name, xml_parser.syntactic_behaviour_dict)):
+            print(f'{datetime.now()}: Verifying {collection_name}')
+            self.verify_nodes(collection_name, nodes)
+        print(f'{datetime.now()}: Verifying {edge_col_name}')
+        self.verify_edges(edge_col_name, self.expected_edges(xml_parser.edge_list, relation_type_collection_map))
+        if hypernym_closure:
+            print(f'{datetime.now()}: Verifying {closure_col_name}')
+            self.verify_edges(closure_col_name, [{**edge, '_from': f"{synset_col_name}/{edge['_from']}", \
+                '_to': f"{synset_col_name}/{edge['_to']}"} for edge in closure])
+        print(f'{datetime.now()}: Done, {len(self.mismatches)} mismatches')
+        return self.mismatches
+
+    def query(self, aql, bind_vars):
+        '''
+        Runs an AQL query, fetching the results from the cursor in batches of batch_size.
+        '''
+        return self.db.AQLQuery(aql, rawResults=True, batchSize=self.batch_size, bindVars=bind_vars)
+
+    def in_sample(self, key):
+        '''
+        Whether a node key (or edge _from) is in the sample. The choice depends only on the key.
+        '''
+        if self.sample_rate >= 1.0:
+            return True
+        return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:8], 16) < self.sample_rate * 0x100000000
+
+    def sampled_docs(self, aql, sample_aql, collection_name, keys):
+        '''
+        Fetches all documents of a collection, or those with the sampled keys in batches.
+        '''
+        if self.sample_rate >= 1.0:
+            yield from self.query(aql, {'@collection': collection_name})
+            return
+        keys = sorted(keys)
+        for i in range(0, len(keys), self.batch_size):
+            yield from self.query(sample_aql, {'@collection': collection_name, 'keys': keys[i:i + self.batch_size]})
+
+    def expected_edges(self, edge_list, relation_type_collection_map):
+        '''
+        The edge documents that ArangoDBGraphCreator.add_edges_to_collection creates.
+        '''
+        edges = []
+        for edge in edge_list:
+            from_collection, to_collection = relation_type_collection_map[edge['relCategory']]
+            edges.append({'_from': f"{from_collection}/{edge['_from']}", \
+                '_to': f"{to_collection}/{edge['_to']}", '_type': edge['_type']})
+        return edges
+
+    def mismatch(self, collection_name, kind, ids):
+        '''
+        Records and prints a mismatch, with up to max_ids of the IDs involved.
+        '''
+        ids = sorted(ids)
+        self.mismatches.append((collection_name, kind, ids))
+        if not ids:
+            print(f'{collection_name}: {kind}')
+            return
+        shown = ', '.join(ids[:self.max_ids])
+        if len(ids) > self.max_ids:
+            shown += f', ... ({len(ids) - self.max_ids} more)'
+        print(f'{collection_name}: {kind}: {shown}')
+
+    def verify_count(self, collection_name, expected_count):
+        db_count = next(iter(self.query(self.count_query, {'@collection': collection_name})))
+        if db_count != expected_count:
+            self.mismatch(collection_name, f'count is {db_count} but should be {expected_count}', [])
+
+    def verify_nodes(self, collection_name, nodes):
+        '''
+        Compares the counts and digests of the documents of a node collection.
+        '''
+        self.verify_count(collection_name, len(nodes))
+        expected = {key: digest({'_key': key, **attributes}) for key, attributes in nodes.items() \
+            if self.in_sample(key)}
+        found = {}
+        for doc in self.sampled_docs(self.node_query, self.node_sample_query, collection_name, expected):
+            found[doc['_key']] = digest(doc)
+        print(f'{collection_name}: digest {combined_digest(expected.values())} from XML, ' \
+            f'{combined_digest(found.values())} from ArangoDB ({len(expected)} documents)')
+        missing = [key for key in expected if key not in found]
+        if missing:
+            self.mismatch(collection_name, 'missing', missing)
+        extra = [key for key in found if key not in expected and self.in_sample(key)]
+        if extra:
+            self.mismatch(collection_name, 'unexpected', extra)
+        different = [key for key, d in expected.items() if key in found and found[key] != d]
+        if different:
+            self.mismatch(collection_name, 'different', different)
+
+    def verify_edges(self, collection_name, edges):
+        '''
+        Compares the counts per _type and digests of an edge collection. Edges have no stable
+        key, so they are compared as a multiset of (_from, _to, _type).
+        '''
+        self.verify_count(collection_name, len(edges))
+        expected_types = Counter(edge['_type'] for edge in edges)
+        db_types = dict(self.query(self.type_count_query, {'@collection': collection_name}))
+        for edge_type in sorted(set(expected_types) | set(db_types)):
+            if expected_types.get(edge_type, 0) != db_types.get(edge_type, 0):
+                self.mismatch(collection_name, f'{db_types.get(edge_type, 0)} edges of _type {edge_type} ' \
+                    f'but should be {expected_types.get(edge_type, 0)}', [])
+        expected = Counter()
+        names = {}
+        for edge in edges:
+            if self.in_sample(edge['_from']):
+                d = digest(edge)
+                expected[d] += 1
+                names[d] = edge
+        found = Counter()
+        froms = set(edge['_from'] for edge in names.values())
+        for doc in self.sampled_docs(self.edge_query, self.edge_sample_query, collection_name, froms):
+            d = digest(doc)
+            found[d] += 1
+            if d not in expected:
+                names[d] = doc
+        print(f'{collection_name}: digest {combined_digest(expected.elements())} from XML, ' \
+            f'{combined_digest(found.elements())} from ArangoDB ({sum(expected.values())} edges)')
+        missing = expected - found
+        if missing:
+            self.mismatch(collection_name, 'missing', [edge_name(names[d]) for d in missing.elements()])
+        extra = found - expected
+        if extra:
+            self.mismatch(collection_name, 'unexpected', [edge_name(names[d]) for d in extra.elements()])
+
+
+def digest(doc):
+    '''
+    The SHA-1 digest of a document, which does not depend on the order of its attributes.
+    '''
+    return hashlib.sha1(json.dumps(doc, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def combined_digest(digests):
+    '''
+    The digest of a collection: the sum of the digests of its documents, so that it does
+    not depend on the order they are returned in.
+    '''
+    return '%040x' % (sum(int(d, 16) for d in digests) % (1 << 160))
+
+def edge_name(edge):
+    return f"{edge.get('_from')} -{edge.get('_type')}-> {edge.get('_to')}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify the WordNet graph in ArangoDB against wn.xml')
+    parser.add_argument('--xml', default='wn.xml', help='The XML file the graph was created from')
+    parser.add_argument('--db', default='wordnet_db', help='The name of the database')
+    parser.add_argument('--url', default='http://127.0.0.1:8529', help='The URL of the ArangoDB server')
+    parser.add_argument('--username', default='wordnet_user')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--batch-size', type=int, default=10000, help='The batch size of the AQL cursors')
+    parser.add_argument('--sample', type=float, default=1.0, \
+        help='The fraction of documents to compare the digests of (default: all)')
+    parser.add_argument('--max-ids', type=int, default=20, help='The number of IDs to print for each mismatch')
+    parser.add_argument('--hypernym-closure', action='store_true', \
+        help='Also verify the hypernym closure edges and paths')
+    args = parser.parse_args()
+    if connect_to_arangodb is None:
+        parser.error('pyArango is needed to connect to ArangoDB')
+
+    verifier = ArangoDBGraphVerifier(args.db, connect_to_arangodb(args.url, args.username, args.password), \
+        args.batch_size, args.sample, args.max_ids)
+    if verifier.verify_ArangoDB_WordNet_against_XML(args.xml, hypernym_closure=args.hypernym_closure):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,9 +8,10 @@ import sense_keys
 
 if __name__ == "__main__":
     wn = change_manager.load_wordnet()
+    keys = sense_keys.SenseKeyCalculator(wn)
     for e in wn.entries:
         for s in e.senses:
             if not s.sense_key:
-                s.sense_key = sense_keys.get_sense_key(wn, e, s, 
+                s.sense_key = keys.sense_key(e, s,
                         wn.synset_by_id(s.synset).lex_name)
     change_manager.save(wn)
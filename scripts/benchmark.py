@@ -0,0 +1,1236 @@
+"""Timing benchmarks for the WordNet scripts. Run from the root of the
+repository after generating wn.xml, e.g.,
+
+    python scripts/benchmark.py parse
+"""
+import argparse
+import codecs
+import glob
+import math
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from enum import Enum
+import wordnet
+import wordnet_yaml
+import validate
+import sense_keys
+import wordnet_query
+import wordnet_similarity
+import wordnet_text
+import change_manager
+
+
+def timed(name, f, *args, **kwargs):
+    """Run f and print the wall time it took"""
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    print("%-40s %8.3fs" % (name, time.perf_counter() - start))
+    return result
+
+
+def same_object(a, b, path="lexicon"):
+    """Compare two objects built by the parser attribute by attribute and
+    return the path of the first difference (or None)"""
+    if type(a) != type(b):
+        return path
+    if isinstance(a, (list, tuple)):
+        if len(a) != len(b):
+            return path
+        for i, (x, y) in enumerate(zip(a, b)):
+            d = same_object(x, y, "%s[%d]" % (path, i))
+            if d:
+                return d
+        return None
+    if isinstance(a, dict):
+        if a.keys() != b.keys():
+            return path
+        for k in a:
+            d = same_object(a[k], b[k], "%s[%r]" % (path, k))
+            if d:
+                return d
+        return None
+    if hasattr(a, "__dict__") and not isinstance(a, Enum):
+        return same_object(a.__dict__, b.__dict__, path)
+    if a != b:
+        return path
+    return None
+
+
+def bench_parse(args):
+    results = {}
+    for parser in args.parsers:
+        results[parser] = timed("parse_wordnet(%s)" % parser,
+                                wordnet.parse_wordnet, args.file, parser)
+    first = args.parsers[0]
+    for parser in args.parsers[1:]:
+        diff = same_object(results[first], results[parser])
+        if diff:
+            print("%s and %s differ at %s" % (first, parser, diff))
+            sys.exit(-1)
+    print("All parsers produced identical lexicons")
+
+
+class FirstWriteTimer:
+    """A file that records when it was first written to"""
+
+    def __init__(self, xml_file):
+        self.xml_file = xml_file
+        self.first_write = None
+
+    def write(self, text):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        self.xml_file.write(text)
+
+
+def export_xml(writer, output, queue):
+    with codecs.open(output, "w", "utf-8") as outp:
+        xml_file = FirstWriteTimer(outp)
+        start = time.perf_counter()
+        if writer == "stream":
+            wordnet_yaml.stream_xml(xml_file, True)
+        else:
+            wordnet_yaml.load().to_xml(xml_file, True)
+        end = time.perf_counter()
+    queue.put((xml_file.first_write - start, end - start,
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def bench_export(args):
+    # Each writer runs in its own process to measure its peak memory
+    for writer in ("stream", "load"):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=export_xml,
+            args=(writer, "%s.%s" % (args.output, writer), queue))
+        process.start()
+        first_write, total, maxrss = queue.get()
+        process.join()
+        print("%-10s first entry %8.3fs  total %8.3fs  peak memory %6d MB" %
+              (writer, first_write, total, maxrss // 1024))
+    with open(args.output + ".stream", "rb") as f1, \
+            open(args.output + ".load", "rb") as f2:
+        if f1.read() != f2.read():
+            print("The XML written by the two writers differs")
+            sys.exit(-1)
+    print("Both writers produced identical XML")
+
+
+def bench_loops(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    errors = timed("check_no_loops", validate.check_no_loops, wn)
+    errors += timed("check_no_domain_loops", validate.check_no_domain_loops,
+                    wn)
+    print("%d loops found" % len(errors))
+
+    # A synthetic taxonomy: a single chain of the given depth with a cycle
+    # closed back up the chain every 1000 nodes
+    graph = {}
+    for i in range(args.depth):
+        graph[i] = [i - 1] if i > 0 else []
+    for i in range(1000, args.depth, 1000):
+        graph[i - 500].append(i)
+    cycles = timed("find_cycles(depth=%d)" % args.depth,
+                   validate.find_cycles, graph)
+    expected = len(range(1000, args.depth, 1000))
+    if len(cycles) != expected:
+        print("Expected %d cycles but found %d" % (expected, len(cycles)))
+        sys.exit(-1)
+    for cycle in cycles:
+        if any(b not in graph[a] for a, b in zip(cycle, cycle[1:])):
+            print("Not a cycle: %s" % cycle)
+            sys.exit(-1)
+    print("All synthetic cycles found")
+
+
+def bench_symmetry(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    timed("check_symmetry", validate.check_symmetry, wn)
+    # Make the first synset a hub with many hyponyms
+    hub = wn.synsets[0]
+    for synset in wn.synsets[1:args.hub_size + 1]:
+        synset.add_synset_relation(
+            wordnet.SynsetRelation(hub.id, wordnet.SynsetRelType.HYPERNYM))
+        hub.add_synset_relation(
+            wordnet.SynsetRelation(synset.id, wordnet.SynsetRelType.HYPONYM))
+    timed("check_symmetry(hub=%d)" % args.hub_size,
+          validate.check_symmetry, wn)
+
+
+def validate_lines(index, names):
+    """The lines printed by the validation rules, one list per rule"""
+    lines = {}
+    for name in names:
+        lines[name] = timed("%s (%s)" % (name, "xml" if index.lexfiles_from_xml
+                                         else "yaml"),
+                            validate.rules[name].check, index, False)
+    return lines
+
+
+def bench_sources(args):
+    names = [r.name for r in validate.rules.values() if r.default]
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    from_xml = validate_lines(validate.ValidationIndex(wn), names)
+    wn = timed("wordnet_yaml.load", wordnet_yaml.load)
+    from_yaml = validate_lines(
+        validate.ValidationIndex(wn, lexfiles_from_xml=False), names)
+    same = True
+    for name in names:
+        if (sorted(f.text for f in from_xml[name]) !=
+                sorted(f.text for f in from_yaml[name])):
+            print("%s differs: %d errors from XML and %d from YAML" %
+                  (name, len(from_xml[name]), len(from_yaml[name])))
+            same = False
+    if not same:
+        sys.exit(-1)
+    print("Validating the YAML gave the same errors as the XML")
+
+
+def remove_sense_from_yaml(synset_key):
+    """Remove the only sense of a synset (by its key in the YAML) from the
+    entries files, leaving the rest of the text as it is. Returns the
+    file changed"""
+    target = "      synset: %s\n" % synset_key
+    for path in sorted(glob.glob("src/yaml/entries-*.yaml")):
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+        if target not in lines:
+            continue
+        start = end = lines.index(target)
+        while not lines[start].startswith("    - "):
+            start -= 1
+        end += 1
+        while end < len(lines) and lines[end].startswith("      "):
+            end += 1
+        del lines[start:end]
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        return path
+
+
+def bench_changed_since(args):
+    # Work on a copy of the YAML in a new git repository, as the check
+    # edits it
+    root = os.getcwd()
+    scratch = tempfile.mkdtemp()
+    shutil.copytree("src/yaml", os.path.join(scratch, "src", "yaml"))
+    os.chdir(scratch)
+    try:
+        for command in (["init", "-q"], ["add", "src"],
+                        ["-c", "user.name=benchmark", "-c",
+                         "user.email=benchmark@localhost", "commit", "-q",
+                         "-m", "Copy of src/yaml"]):
+            subprocess.run(["git"] + command, check=True)
+        wn = timed("wordnet_yaml.load", wordnet_yaml.load)
+        # A synset whose only member belongs to an entry with other senses,
+        # which is left empty when the sense is removed
+        random.seed(0)
+        synset = random.choice(
+            [synset for synset in wn.synsets
+             if len(wn.senses_by_synset(synset.id)) == 1
+             and len(wn.entry_by_sense(
+                 wn.senses_by_synset(synset.id)[0].id).senses) > 1])
+        path = remove_sense_from_yaml(synset.id[5:])
+        print("Removed the sense of %s from %s" % (synset.id, path))
+        wn = timed("wordnet_yaml.load", wordnet_yaml.load)
+        expected = "ERROR: Empty synset " + synset.id
+        names = ["entries", "synsets"]
+        full = validate_lines(
+            validate.ValidationIndex(wn, lexfiles_from_xml=False), names)
+        if not any(f.text == expected for f in full["synsets"]):
+            print("The full validation did not find the empty synset")
+            sys.exit(-1)
+        change_list = timed("changes_since", change_manager.changes_since,
+                            wn, "HEAD")
+        local = []
+        timed("validate_changes", validate.validate_changes, wn, change_list,
+              names, output=lambda name, findings, fix:
+              local.extend(findings))
+        if not any(f.text == expected for f in local):
+            print("Validating the changes did not find the empty synset")
+            sys.exit(-1)
+        print("Both found: %s" % expected)
+    finally:
+        os.chdir(root)
+        shutil.rmtree(scratch)
+
+
+def bench_sense_keys(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    lexfiles = {lexfile: wordnet.parse_wordnet_cached(
+                    "src/xml/wn-%s.xml" % lexfile)
+                for lexfile in args.lexfiles}
+    start = time.perf_counter()
+    single = [sense_keys.get_sense_key(wn, entry, sense, lexfile)
+              for lexfile, lexicon in lexfiles.items()
+              for entry in lexicon.entries for sense in entry.senses]
+    print("%-40s %8.3fs" % ("get_sense_key", time.perf_counter() - start))
+    batch = timed("get_sense_keys", lambda: [
+        key for _, _, key in sense_keys.get_sense_keys(wn, lexfiles)])
+    if single != batch:
+        print("The sense keys differ")
+        sys.exit(-1)
+    print("Both computed the same %d sense keys" % len(batch))
+
+
+def allocated(name, f, *args):
+    """Run f and print the wall time and the peak memory it allocated"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("%-40s %8.3fs %8d KB peak" % (name, seconds, peak // 1024))
+    return result
+
+
+def counter_duplicates(relation_lists):
+    # How check_synsets and check_entries found duplicates before
+    found = []
+    for relations in relation_lists:
+        counter = Counter((r.target, r.rel_type) for r in relations)
+        found.extend(item for item, count in counter.items() if count > 1)
+    return found
+
+
+def single_pass_duplicates(relation_lists):
+    found = []
+    for relations in relation_lists:
+        found.extend(validate.duplicates((r.target, r.rel_type)
+                                         for r in relations))
+    return found
+
+
+def bench_duplicates(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    for synset in wn.synsets[:args.duplicates]:
+        if synset.synset_relations:
+            synset.synset_relations.append(synset.synset_relations[0])
+    relation_lists = ([synset.synset_relations for synset in wn.synsets] +
+                      [sense.sense_relations for entry in wn.entries
+                       for sense in entry.senses])
+    before = allocated("Counter", counter_duplicates, relation_lists)
+    after = allocated("single pass", single_pass_duplicates, relation_lists)
+    if sorted(map(str, before)) != sorted(map(str, after)):
+        print("The duplicates found differ")
+        sys.exit(-1)
+    print("Both found the same %d duplicates" % len(after))
+
+
+def scan_transitive(wn):
+    # How check_transitive found errors before, rescanning the relations of
+    # the synset for each grandparent
+    found = []
+    for synset in wn.synsets:
+        for rel in synset.synset_relations:
+            if rel.rel_type == wordnet.SynsetRelType.HYPERNYM:
+                synset2 = wn.synset_by_id(rel.target)
+                for rel2 in synset2.synset_relations:
+                    if (any(r for r in synset.synset_relations if r.target ==
+                            rel2.target and r.rel_type ==
+                            wordnet.SynsetRelType.HYPERNYM) and
+                            rel2.rel_type == wordnet.SynsetRelType.HYPERNYM):
+                        found.append([synset.id, synset2.id, rel2.target])
+    return found
+
+
+def walk_ancestors(hypernyms, synset_id):
+    """All ancestors of a synset, by walking up the hypernyms"""
+    seen = set()
+    stack = [synset_id]
+    while stack:
+        for parent in hypernyms.get(stack.pop(), ()):
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return seen
+
+
+def walk_redundant_hypernyms(wn):
+    # The hypernyms that are an ancestor of another hypernym of the same
+    # synset, with the first such other hypernym
+    hypernyms = validate.hypernym_lists(wn)
+    found = []
+    for synset in wn.synsets:
+        parents = hypernyms[synset.id]
+        if len(parents) < 2:
+            continue
+        for target in parents:
+            via = [t for t in parents if t != target
+                   and target in walk_ancestors(hypernyms, t)]
+            if via:
+                found.append([synset.id, target, via[0]])
+    return found
+
+
+def bench_transitive(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    # Add a hypernym to some synsets that is already their ancestor, at
+    # depth two for half of them and deeper for the rest
+    random.seed(0)
+    hypernyms = validate.hypernym_lists(wn)
+    candidates = [synset for synset in wn.synsets
+                  if len(walk_ancestors(hypernyms, synset.id)) > 3]
+    for i, synset in enumerate(random.sample(candidates, args.edges)):
+        parent = hypernyms[synset.id][0]
+        if i % 2 == 0:
+            target = hypernyms[parent][0]
+        else:
+            target = sorted(walk_ancestors(hypernyms, parent)
+                            - set(hypernyms[parent]))[0]
+        synset.synset_relations.append(wordnet.SynsetRelation(
+            target, wordnet.SynsetRelType.HYPERNYM))
+    before = timed("scan (before)", scan_transitive, wn)
+    after = timed("check_transitive", validate.check_transitive, wn)
+    if before != [f.subjects for f in after]:
+        print("The transitive errors differ")
+        sys.exit(-1)
+    print("Both found the same %d transitive errors" % len(after))
+    walked = timed("walk ancestors", walk_redundant_hypernyms, wn)
+    redundant = timed("check_redundant_hypernyms",
+                      validate.check_redundant_hypernyms, wn)
+    if walked != [f.subjects for f in redundant]:
+        print("The redundant hypernyms differ")
+        sys.exit(-1)
+    print("Both found the same %d redundant hypernyms" % len(redundant))
+
+
+def hypernym_parents(wn):
+    """The hypernyms of each synset, including the inverses of hyponyms, as
+    HypernymIndex reads them"""
+    up = {wordnet.SynsetRelType.HYPERNYM,
+          wordnet.SynsetRelType.INSTANCE_HYPERNYM}
+    down = {wordnet.SynsetRelType.HYPONYM,
+            wordnet.SynsetRelType.INSTANCE_HYPONYM}
+    parents = {synset.id: set() for synset in wn.synsets}
+    for synset in wn.synsets:
+        for rel in synset.synset_relations:
+            if rel.target not in parents:
+                continue
+            if rel.rel_type in up:
+                parents[synset.id].add(rel.target)
+            elif rel.rel_type in down:
+                parents[rel.target].add(synset.id)
+    return parents
+
+
+def bench_hypernyms(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    index = timed("HypernymIndex", wordnet_query.HypernymIndex, wn)
+    parents = hypernym_parents(wn)
+    children = {synset_id: [] for synset_id in parents}
+    for synset_id, synset_parents in parents.items():
+        for parent in synset_parents:
+            children[parent].append(synset_id)
+    # The shortest depth of every synset, by a BFS down from the roots
+    depths = {s: 0 for s, synset_parents in parents.items()
+              if not synset_parents}
+    frontier = list(depths)
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            for child in children[node]:
+                if child not in depths:
+                    depths[child] = depths[node] + 1
+                    next_frontier.append(child)
+        frontier = next_frontier
+    for synset_id, depth in depths.items():
+        if index.depth(synset_id) != depth:
+            print("The depth of %s differs" % synset_id)
+            sys.exit(-1)
+    random.seed(0)
+    ids = list(parents)
+    for synset_id in random.sample(ids, args.synsets):
+        ancestors = walk_ancestors(parents, synset_id)
+        if set(index.ancestors(synset_id)) != ancestors:
+            print("The ancestors of %s differ" % synset_id)
+            sys.exit(-1)
+        others = random.sample(ids, 20)
+        for other in list(ancestors) + others + [synset_id]:
+            if (index.is_a(synset_id, other)
+                    != (other in ancestors or other == synset_id)):
+                print("is_a(%s, %s) differs" % (synset_id, other))
+                sys.exit(-1)
+        if (index.descendant_count(synset_id)
+                != len(walk_ancestors(children, synset_id))):
+            print("The descendants of %s differ" % synset_id)
+            sys.exit(-1)
+    print("Depths of %d synsets, and ancestors, is_a and descendants of %d "
+          "synsets are the same as walking the hierarchy" % (
+              len(depths), args.synsets))
+
+
+def scan_sense_indexes(wn):
+    """The sense indexes of the lexicon, rebuilt by scanning the entries"""
+    synset2senses = {}
+    sense2entry = {}
+    id2sense = {}
+    sense2synset = {}
+    for entry in wn.entries:
+        for sense in entry.senses:
+            synset2senses.setdefault(sense.synset, []).append(sense.id)
+            sense2entry[sense.id] = entry.id
+            id2sense[sense.id] = sense
+            sense2synset[sense.id] = sense.synset
+    return synset2senses, sense2entry, id2sense, sense2synset
+
+
+def check_sense_indexes(wn, ordered):
+    """Compare the sense indexes with a scan of the entries and exit if
+    they differ. The senses of a synset are in entry order only until the
+    lexicon is edited"""
+    synset2senses, sense2entry, id2sense, sense2synset = scan_sense_indexes(
+        wn)
+    indexed = {synset_id: [sense.id for sense in senses]
+               for synset_id, senses in wn.synset2senses.items()}
+    if not ordered:
+        synset2senses = {synset_id: sorted(senses)
+                         for synset_id, senses in synset2senses.items()}
+        indexed = {synset_id: sorted(senses)
+                   for synset_id, senses in indexed.items()}
+    if indexed != synset2senses:
+        print("The senses of the synsets differ")
+        sys.exit(-1)
+    for synset in wn.synsets:
+        scanned = synset2senses.get(synset.id, [])
+        found = change_manager.sense_ids_for_synset(wn, synset)
+        if (found if ordered else sorted(found)) != scanned:
+            print("sense_ids_for_synset(%s) differs" % synset.id)
+            sys.exit(-1)
+    if wn.sense2entry != sense2entry:
+        print("The entries of the senses differ")
+        sys.exit(-1)
+    if wn.sense2synset != sense2synset:
+        print("The synsets of the senses differ")
+        sys.exit(-1)
+    if (wn.id2sense.keys() != id2sense.keys()
+            or any(wn.id2sense[s] is not id2sense[s] for s in id2sense)):
+        print("The senses by ID differ")
+        sys.exit(-1)
+    return sum(len(senses) for senses in synset2senses.values())
+
+
+def bench_sense_index(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    senses = timed("check_sense_indexes", check_sense_indexes, wn, True)
+    print("Both found the same %d senses after loading" % senses)
+    random.seed(0)
+    synset_ids = [synset.id for synset in wn.synsets]
+    counts = Counter()
+    for i in range(args.edits):
+        entry = random.choice(wn.entries)
+        if i % 4 == 0:
+            sense = wordnet.Sense("%s-%d" % (entry.id, i),
+                                  random.choice(synset_ids), None)
+            wn.add_sense(entry, sense)
+            if entry.senses:
+                # A sense the entry already has is not indexed again
+                wn.add_sense(entry, entry.senses[0])
+            counts["add_sense"] += 1
+        elif i % 4 == 1 and entry.senses:
+            wn.del_sense(entry, random.choice(entry.senses))
+            counts["del_sense"] += 1
+        elif i % 4 == 2 and entry.senses:
+            sense = random.choice(entry.senses)
+            if i % 8 == 2:
+                sense.synset = random.choice(synset_ids)
+            wn.change_sense_id(sense, "%s-%d" % (entry.id, i))
+            counts["change_sense_id"] += 1
+        elif i % 4 == 3:
+            wn.del_entry(entry)
+            counts["del_entry"] += 1
+    senses = timed("check_sense_indexes", check_sense_indexes, wn, False)
+    print("Both found the same %d senses after %s" % (
+        senses, ", ".join("%d %s" % (n, op) for op, n in counts.items())))
+
+
+def same_scores(a, b):
+    return len(a) == len(b) and all(
+        x == y or (x is not None and y is not None and math.isclose(x, y))
+        for x, y in zip(a, b))
+
+
+def bench_similarity(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    hypernyms = timed("HypernymIndex", wordnet_query.HypernymIndex, wn)
+    ic = timed("intrinsic_ic", wordnet_similarity.intrinsic_ic, hypernyms)
+    if os.path.exists(args.ic_cache):
+        os.remove(args.ic_cache)
+    timed("load_ic (computed)", wordnet_similarity.load_ic, hypernyms,
+          args.ic_cache)
+    cached = timed("load_ic (cached)", wordnet_similarity.load_ic,
+                   hypernyms, args.ic_cache)
+    if cached != ic:
+        print("The cached information content differs")
+        sys.exit(-1)
+    # Moving a synset to another hypernym keeps the same synsets, but the
+    # cache must not be used for the changed hierarchy
+    moved = next(s for s in wn.synsets if s.synset_relations
+                 and s.synset_relations[0].rel_type
+                 == wordnet.SynsetRelType.HYPERNYM)
+    old_target = moved.synset_relations[0].target
+    moved.synset_relations[0].target = next(
+        s.id for s in wn.synsets if s.part_of_speech == moved.part_of_speech
+        and s.id not in (old_target, moved.id)
+        and not hypernyms.is_a(s.id, moved.id))
+    edited = wordnet_query.HypernymIndex(wn)
+    if (wordnet_similarity.load_ic(edited, args.ic_cache)
+            != wordnet_similarity.intrinsic_ic(edited)):
+        print("The cached information content was used after an edit")
+        sys.exit(-1)
+    moved.synset_relations[0].target = old_target
+    similarity = timed("SimilarityIndex", wordnet_similarity.SimilarityIndex,
+                       hypernyms, ic)
+    random.seed(0)
+    nouns = [synset.id for synset in wn.synsets
+             if synset.part_of_speech == wordnet.PartOfSpeech.NOUN]
+    pairs = [(random.choice(nouns), random.choice(nouns))
+             for _ in range(args.pairs)]
+    if wordnet_similarity.numpy is None:
+        print("NumPy is not installed, so the batches are scored in Python")
+    for measure in ("path", "lch", "wup", "res", "lin", "jcn"):
+        score = getattr(similarity, measure + "_similarity")
+        start = time.perf_counter()
+        single = [score(a, b) for a, b in pairs]
+        seconds = time.perf_counter() - start
+        print("%-40s %8.0f pairs/s" % (measure, len(pairs) / seconds))
+        start = time.perf_counter()
+        batch = similarity.similarities(pairs, measure)
+        seconds = time.perf_counter() - start
+        print("%-40s %8.0f pairs/s" % (measure + " (batch)",
+                                       len(pairs) / seconds))
+        if not same_scores(single, batch):
+            print("The batch scores differ")
+            sys.exit(-1)
+
+
+def bench_lemmas(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    lemmas = timed("LemmaIndex", wordnet_query.LemmaIndex, wn)
+    for written_form, entry_ids in wn.member2entry.items():
+        found = [entry_id for entry_id, _ in lemmas.lookup(written_form)]
+        if not set(entry_ids) <= set(found):
+            print("%s is missing entries" % written_form)
+            sys.exit(-1)
+    random.seed(0)
+    forms = [form.written_form for entry in wn.entries
+             for form in [entry.lemma] + entry.forms]
+    tokens = [random.choice(forms) for _ in range(args.tokens)]
+    tokens = [t.upper() if i % 3 == 0 else t.replace(" ", "_")
+              for i, t in enumerate(tokens)]
+    tokens += ["notaword%d" % i for i in range(args.tokens // 10)]
+    start = time.perf_counter()
+    single = [lemmas.lookup(t) for t in tokens]
+    seconds = time.perf_counter() - start
+    print("%-40s %8.0f lookups/s" % ("lookup", len(tokens) / seconds))
+    start = time.perf_counter()
+    bulk = lemmas.lookup_all(tokens)
+    seconds = time.perf_counter() - start
+    print("%-40s %8.0f lookups/s" % ("lookup_all", len(tokens) / seconds))
+    start = time.perf_counter()
+    nouns = lemmas.lookup_all(tokens, wordnet.PartOfSpeech.NOUN)
+    seconds = time.perf_counter() - start
+    print("%-40s %8.0f lookups/s" % ("lookup_all (nouns)",
+                                     len(tokens) / seconds))
+    if single != bulk or any(
+            [r for r in s if r[1] == wordnet.PartOfSpeech.NOUN] != n
+            for s, n in zip(single, nouns)):
+        print("The bulk lookups differ")
+        sys.exit(-1)
+    print("%d of %d tokens found" % (sum(1 for r in bulk if r), len(tokens)))
+
+
+def latencies(name, f, queries):
+    """Run f on each query and print the median and slowest latency"""
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        f(query)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print("%-40s %8.3fms median %8.3fms p99 %8.3fms max" % (
+        name, 1000 * times[len(times) // 2],
+        1000 * times[len(times) * 99 // 100], 1000 * times[-1]))
+
+
+def typo(text, edits):
+    for _ in range(edits):
+        i = random.randrange(len(text) + 1)
+        kind = random.choice("ids")
+        if kind == "i":
+            text = text[:i] + random.choice("abcdefghijklmnopqrstuvwxyz") + \
+                text[i:]
+        elif kind == "d" and len(text) > 1:
+            text = text[:i] + text[i + 1:]
+        else:
+            text = text[:i] + random.choice("aeiou") + text[i + 1:]
+    return text
+
+
+def bench_search(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    search = timed("LemmaSearch", wordnet_query.LemmaSearch, wn,
+                   args.distance)
+    timed("LemmaSearch.save", search.save, args.output)
+    loaded = timed("LemmaSearch.load", wordnet_query.LemmaSearch.load,
+                   args.output)
+    if loaded.keys != search.keys or loaded.deletes != search.deletes:
+        print("The loaded index differs")
+        sys.exit(-1)
+    random.seed(0)
+    words = random.sample(search.keys, args.queries)
+    latencies("prefix (3 characters)", search.prefix,
+              [w[:3] for w in words])
+    latencies("prefix (1 character, limit 100)",
+              lambda q: search.prefix(q, 100), [w[:1] for w in words])
+    typos = [typo(w, random.randint(1, args.distance)) for w in words]
+    latencies("fuzzy", search.fuzzy, typos)
+    # Check against comparing with every key
+    for query in typos[:args.checks]:
+        key = wordnet_query.normalize_form(query)
+        expected = sorted(
+            (wordnet_query.edit_distance(key, k, args.distance), k)
+            for k in search.keys
+            if abs(len(k) - len(key)) <= args.distance)
+        expected = set(k for d, k in expected if d <= args.distance)
+        found = set(wordnet_query.normalize_form(w)
+                    for w, _ in search.fuzzy(query, limit=None))
+        if found != expected:
+            print("Fuzzy search for %s differs" % query)
+            sys.exit(-1)
+    print("Fuzzy search found the same as comparing every key for %d "
+          "queries" % args.checks)
+
+
+def scan_search(wn, query, limit=10):
+    """Search by scanning every synset, counting the query words in each"""
+    words = set(wordnet_text.tokenize(query))
+    scores = []
+    for synset in wn.synsets:
+        text = wordnet_text.tokenize(wordnet_text.synset_text(synset))
+        score = sum(1 for word in text if word in words)
+        if score:
+            scores.append((score, synset.id))
+    scores.sort(reverse=True)
+    return scores[:limit]
+
+
+def bench_text(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    index = timed("TextIndex", wordnet_text.TextIndex, wn)
+    timed("TextIndex.save", index.save, args.output)
+    timed("TextIndex.load", wordnet_text.TextIndex.load, args.output)
+    size = sum(len(gaps) * gaps.itemsize + len(tfs) * tfs.itemsize
+               for gaps, tfs in index.postings.values())
+    print("%d words, %d postings in %d bytes" % (
+        len(index.postings),
+        sum(len(gaps) for gaps, _ in index.postings.values()), size))
+    random.seed(0)
+    synsets = random.sample(wn.synsets, args.queries)
+    queries = [" ".join(wordnet_text.tokenize(ss.definitions[0].text)[:4])
+               for ss in synsets if ss.definitions]
+    latencies("search", index.search, queries)
+    latencies("scan", lambda q: scan_search(wn, q), queries[:args.scans])
+    # Edit some synsets through the change manager and compare with an
+    # index built from scratch
+    for ss in synsets[:args.edits]:
+        change_manager.add_ex(wn, ss, "an example about zebras and %s"
+                              % ss.id, text_index=index)
+        change_manager.update_def(wn, ss, "a new definition of %s" % ss.id,
+                                  False, text_index=index)
+        if ss.examples:
+            change_manager.delete_ex(wn, ss, ss.examples[0].text,
+                                     text_index=index)
+    fresh = wordnet_text.TextIndex(wn)
+    check = queries[:100] + ["zebras", "new definition"]
+    if [index.search(q) for q in check] != [fresh.search(q) for q in check]:
+        print("The updated index differs from a new one")
+        sys.exit(-1)
+    timed("TextIndex.compact", index.compact)
+    if index.postings != fresh.postings:
+        print("The compacted index differs from a new one")
+        sys.exit(-1)
+    print("The updated index is the same as a new one after %d edits"
+          % args.edits)
+
+
+def object_expand(wn, members, seeds, synset_rel_types, sense_rel_types,
+                  hops):
+    """Expand each seed synset by looping over the relation objects"""
+    found = {}
+    for seed in seeds:
+        frontier = [seed]
+        distance = {seed: 0}
+        for hop in range(1, hops + 1):
+            next_frontier = []
+            for synset_id in frontier:
+                synset = wn.synset_by_id(synset_id)
+                targets = [rel.target for rel in synset.synset_relations
+                           if rel.rel_type in synset_rel_types]
+                for sense in members.get(synset_id, []):
+                    for rel in wn.sense_by_id(sense).sense_relations:
+                        if rel.rel_type in sense_rel_types:
+                            targets.append(wn.sense_to_synset(rel.target))
+                for target in targets:
+                    if target not in distance:
+                        distance[target] = hop
+                        next_frontier.append(target)
+            frontier = next_frontier
+        for synset_id, d in distance.items():
+            found[synset_id] = min(d, found.get(synset_id, d))
+    return found
+
+
+def bench_expand(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    graph = timed("RelationGraph", wordnet_query.RelationGraph, wn)
+    synset_rel_types = {wordnet.SynsetRelType.HYPERNYM,
+                        wordnet.SynsetRelType.SIMILAR}
+    sense_rel_types = {wordnet.SenseRelType.DERIVATION}
+    mask = graph.mask(synset_rel_types | sense_rel_types)
+    timed("mask adjacency", graph._adjacency, mask)
+    random.seed(0)
+    seeds = [synset.id for synset in random.sample(wn.synsets, args.seeds)]
+    members = {}
+    for entry in wn.entries:
+        for sense in entry.senses:
+            members.setdefault(sense.synset, []).append(sense.id)
+    for hops in range(1, args.hops + 1):
+        start = time.perf_counter()
+        nodes, distances, _ = graph.expand(seeds, mask, hops)
+        seconds = time.perf_counter() - start
+        print("%-40s %8.3fs %d synsets" % ("expand (%d hops)" % hops,
+                                           seconds, len(nodes)))
+        start = time.perf_counter()
+        expected = object_expand(wn, members, seeds, synset_rel_types,
+                                 sense_rel_types, hops)
+        seconds = time.perf_counter() - start
+        print("%-40s %8.3fs" % ("relation objects (%d hops)" % hops,
+                                seconds))
+        found = {graph.ids[n]: d for n, d in zip(nodes, distances)}
+        if found != expected:
+            print("The expansions differ")
+            sys.exit(-1)
+
+
+def zipf_sample(items, k):
+    """k items drawn with the probability of the i-th proportional to 1/i,
+    like the queries of many users"""
+    return random.choices(items, weights=[1 / (i + 1) for i in
+                                          range(len(items))], k=k)
+
+
+def bench_cache(args):
+    wn = timed("parse_wordnet", wordnet.parse_wordnet, args.file)
+    cache = wordnet_query.QueryCache(wn, args.maxsize)
+    lemmas = timed("LemmaIndex", cache.index, wordnet_query.LemmaIndex)
+    hypernyms = timed("HypernymIndex", cache.index,
+                      wordnet_query.HypernymIndex)
+    graph = timed("RelationGraph", cache.index, wordnet_query.RelationGraph)
+    neighbours = {wordnet.SynsetRelType.HYPERNYM,
+                  wordnet.SynsetRelType.HYPONYM,
+                  wordnet.SynsetRelType.SIMILAR}
+    mask = graph.mask(neighbours)
+    random.seed(0)
+    forms = [entry.lemma.written_form for entry in wn.entries]
+    synset_ids = [synset.id for synset in wn.synsets]
+    random.shuffle(forms)
+    random.shuffle(synset_ids)
+    queries = [
+        ("lookup", lemmas.lookup, cache.lookup,
+         [(f,) for f in zipf_sample(forms, args.queries)]),
+        ("ancestors", hypernyms.ancestors, cache.ancestors,
+         [(s,) for s in zipf_sample(synset_ids, args.queries)]),
+        ("expand (%d hops)" % args.hops, graph.expand, cache.expand,
+         [([s], mask, args.hops)
+          for s in zipf_sample(synset_ids, args.queries)])]
+    for name, uncached, cached, calls in queries:
+        hits, misses = cache.hits, cache.misses
+        start = time.perf_counter()
+        expected = [uncached(*call) for call in calls]
+        seconds = time.perf_counter() - start
+        print("%-40s %8.0f queries/s" % (name, len(calls) / seconds))
+        start = time.perf_counter()
+        found = [cached(*call) for call in calls]
+        seconds = time.perf_counter() - start
+        print("%-40s %8.0f queries/s %5.1f%% hits" % (
+            name + " (cached)", len(calls) / seconds,
+            100 * (cache.hits - hits)
+            / max(1, cache.hits - hits + cache.misses - misses)))
+        if found != expected:
+            print("The cached results of %s differ" % name)
+            sys.exit(-1)
+
+    # A new hypernym made through a change list must be seen by the cache
+    change_list = change_manager.ChangeList()
+    change_list.listeners.append(cache.invalidate)
+    synset_id = calls[0][0][0]
+    cache.ancestors(synset_id)
+    ancestors = set(hypernyms.ancestors(synset_id))
+    parent = next(s for s in wn.synsets if s.id not in ancestors
+                  and s.id != synset_id
+                  and s.part_of_speech == wn.synset_by_id(
+                      synset_id).part_of_speech
+                  and not hypernyms.is_a(s.id, synset_id))
+    change_manager.add_relation(wn, wn.synset_by_id(synset_id), parent,
+                                wordnet.SynsetRelType.HYPERNYM, change_list)
+    found = cache.ancestors(synset_id)
+    if (parent.id not in found or found
+            != wordnet_query.HypernymIndex(wn).ancestors(synset_id)):
+        print("The cache was not invalidated")
+        sys.exit(-1)
+    print("%d invalidations, %d results cached" % (cache.invalidations,
+                                                  len(cache.results)))
+
+
+def import_arango():
+    """The ArangoDB scripts, which import each other from scripts/arango"""
+    arango = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "arango")
+    if arango not in sys.path:
+        sys.path.insert(0, arango)
+    import arango_standin
+    import parse_xml
+    import verify_wn_graph_arango
+    return arango_standin, parse_xml, verify_wn_graph_arango
+
+
+def bench_verify_arango(args):
+    arango_standin, parse_xml, verify = import_arango()
+    xml_parser = parse_xml.WordNetXMLParser(args.file)
+    timed("WordNetXMLParser", xml_parser.parse)
+    db = arango_standin.StandInDatabase()
+    timed("load stand-in", db.load_parsed, xml_parser)
+    for sample in (1.0, args.sample):
+        db.requests = 0
+        verifier = verify.ArangoDBGraphVerifier(sample_rate=sample)
+        mismatches = timed("verify (sample %g)" % sample,
+                           verifier.verify_ArangoDB_WordNet_against_XML,
+                           args.file, db=db)
+        print("%-40s %8d requests" % ("", db.requests))
+        if mismatches:
+            print("The unchanged graph has mismatches")
+            sys.exit(-1)
+
+    # Break one document or edge of each kind, choosing ones in the sample
+    # so that both runs must report them
+    in_sample = verify.ArangoDBGraphVerifier(sample_rate=args.sample).in_sample
+    synsets = db["synsets"].documents
+    synset = next(d for d in synsets if in_sample(d["_key"]))
+    synsets.remove(synset)
+    sense = next(d for d in db["sense_ids"].documents if in_sample(d["_key"]))
+    sense["writtenForm"] += "x"
+    edges = db["edges"].documents
+    sampled = [d for d in edges if in_sample(d["_from"])]
+    duplicate = dict(sampled[0], _key="duplicate")
+    edges.append(duplicate)
+    retyped = sampled[1]
+    old_name = verify.edge_name(retyped)
+    retyped["_type"] = "retyped"
+    expected = [("synsets", "missing", synset["_key"]),
+                ("sense_ids", "different", sense["_key"]),
+                ("edges", "unexpected", verify.edge_name(duplicate)),
+                ("edges", "missing", old_name),
+                ("edges", "unexpected", verify.edge_name(retyped))]
+    for sample in (1.0, args.sample):
+        verifier = verify.ArangoDBGraphVerifier(sample_rate=sample)
+        mismatches = verifier.verify_ArangoDB_WordNet_against_XML(args.file,
+                                                                  db=db)
+        for collection_name, kind, id in expected:
+            if not any(c == collection_name and k == kind and id in ids
+                       for c, k, ids in mismatches):
+                print("%s %s %s was not reported (sample %g)" %
+                      (collection_name, kind, id, sample))
+                sys.exit(-1)
+    print("All %d changes reported" % len(expected))
+
+
+# A small hypernym DAG: "child" has two hypernyms, "instance" is an
+# instance of it, "leaf" is a kind of the instance, and "loop-a" and
+# "loop-b" are each other's hypernym
+closure_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<LexicalResource>
+  <Lexicon id="test" label="Test" language="en" email="" license=""
+           version="1">
+    <LexicalEntry id="child-n">
+      <Lemma writtenForm="child" partOfSpeech="n"/>
+      <Sense id="child-n-child" synset="child"/>
+    </LexicalEntry>
+%s
+  </Lexicon>
+</LexicalResource>
+"""
+closure_relations = {"root": [], "left": [("hypernym", "root")],
+                     "right": [("hypernym", "root")],
+                     "child": [("hypernym", "left"), ("hypernym", "right")],
+                     "instance": [("instance_hypernym", "child")],
+                     "leaf": [("hypernym", "instance")],
+                     "loop-a": [("hypernym", "loop-b")],
+                     "loop-b": [("hypernym", "loop-a")]}
+# The ancestors of each synset with their depths, and the hypernym paths of
+# those not in a loop, which depend on where the loop is broken
+closure_ancestors = {"root": {}, "left": {"root": 1}, "right": {"root": 1},
+                     "child": {"left": 1, "right": 1, "root": 2},
+                     "instance": {"child": 1, "left": 2, "right": 2,
+                                  "root": 3},
+                     "leaf": {"instance": 1, "child": 2, "left": 3,
+                              "right": 3, "root": 4},
+                     "loop-a": {"loop-b": 1}, "loop-b": {"loop-a": 1}}
+closure_paths = {"root": [["root"]], "left": [["root", "left"]],
+                 "right": [["root", "right"]],
+                 "child": [["root", "left", "child"],
+                           ["root", "right", "child"]],
+                 "instance": [["root", "left", "child", "instance"],
+                              ["root", "right", "child", "instance"]],
+                 "leaf": [["root", "left", "child", "instance", "leaf"],
+                          ["root", "right", "child", "instance", "leaf"]]}
+
+
+def bench_arango_closure(args):
+    arango_standin, parse_xml, verify = import_arango()
+    import create_wn_graph_arango
+    synsets = "\n".join(
+        '    <Synset id="%s" partOfSpeech="n">\n%s    </Synset>' % (
+            name, "".join('      <SynsetRelation relType="%s" target="%s"/>\n'
+                          % rel for rel in rels))
+        for name, rels in closure_relations.items())
+    with open(args.output, "w") as out:
+        out.write(closure_xml % synsets)
+    connection = arango_standin.StandInConnection()
+    creator = create_wn_graph_arango.ArangoDBGraphCreator(
+        connection=connection)
+    creator.create_ArangoDB_WordNet_from_XML(args.output,
+                                             hypernym_closure=True)
+    db = connection["wordnet_db"]
+
+    ancestors = {name: {} for name in closure_relations}
+    for edge in db["hypernym_closure"].documents:
+        if edge["_type"] != "ancestor":
+            print("Unexpected closure edge type %s" % edge["_type"])
+            sys.exit(-1)
+        ancestors[edge["_from"].split("/")[1]][
+            edge["_to"].split("/")[1]] = edge["depth"]
+    if ancestors != closure_ancestors:
+        print("The closure edges are wrong: %s" % ancestors)
+        sys.exit(-1)
+    paths = {doc["_key"]: sorted(doc["hypernymPaths"])
+             for doc in db["synsets"].documents
+             if not doc["_key"].startswith("loop")}
+    if paths != closure_paths:
+        print("The hypernym paths are wrong: %s" % paths)
+        sys.exit(-1)
+
+    verifier = verify.ArangoDBGraphVerifier()
+    if verifier.verify_ArangoDB_WordNet_against_XML(args.output, db=db,
+                                                    hypernym_closure=True):
+        print("The verifier found mismatches in the closure")
+        sys.exit(-1)
+    db["hypernym_closure"].documents[0]["depth"] += 1
+    verifier = verify.ArangoDBGraphVerifier()
+    if not verifier.verify_ArangoDB_WordNet_against_XML(
+            args.output, db=db, hypernym_closure=True):
+        print("The verifier did not find a wrong depth")
+        sys.exit(-1)
+    print("The closure of %d synsets has %d edges, as expected" % (
+        len(closure_relations), len(db["hypernym_closure"].documents)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the WordNet scripts")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parse_args = subparsers.add_parser(
+        "parse", help="Compare the XML parser backends")
+    parse_args.add_argument("--file", default="wn.xml",
+                            help="The XML file to parse")
+    parse_args.add_argument("--parsers", nargs="+",
+                            default=list(wordnet.parsers.keys()),
+                            help="The parsers to compare")
+    parse_args.set_defaults(func=bench_parse)
+
+    export_args = subparsers.add_parser(
+        "export", help="Compare streaming the XML from YAML with load()")
+    export_args.add_argument("--output", default="/tmp/wn-export.xml",
+                             help="The prefix of the XML files to write")
+    export_args.set_defaults(func=bench_export)
+
+    loops_args = subparsers.add_parser(
+        "loops", help="Time the hypernym and domain loop checks")
+    loops_args.add_argument("--file", default="wn.xml",
+                            help="The XML file to check")
+    loops_args.add_argument("--depth", type=int, default=1000000,
+                            help="The depth of the synthetic taxonomy")
+    loops_args.set_defaults(func=bench_loops)
+
+    symmetry_args = subparsers.add_parser(
+        "symmetry", help="Time the symmetry check")
+    symmetry_args.add_argument("--file", default="wn.xml",
+                               help="The XML file to check")
+    symmetry_args.add_argument("--hub-size", type=int, default=20000,
+                               help="The number of hyponyms of the hub synset")
+    symmetry_args.set_defaults(func=bench_symmetry)
+
+    sources_args = subparsers.add_parser(
+        "sources", help="Compare validating the XML with validating the YAML")
+    sources_args.add_argument("--file", default="wn.xml",
+                              help="The XML file generated from the YAML")
+    sources_args.set_defaults(func=bench_sources)
+
+    changed_since_args = subparsers.add_parser(
+        "changed-since", help="Check that validating the changes since a "
+        "revision finds a synset emptied by removing a sense")
+    changed_since_args.set_defaults(func=bench_changed_since)
+
+    sense_keys_args = subparsers.add_parser(
+        "sense-keys", help="Compare computing sense keys one at a time and "
+        "in a batch")
+    sense_keys_args.add_argument("--file", default="wn.xml",
+                                 help="The XML file to check")
+    sense_keys_args.add_argument("--lexfiles", nargs="+",
+                                 default=["adj.all", "adj.pert", "adj.ppl"],
+                                 help="The lexfiles in src/xml to compute")
+    sense_keys_args.set_defaults(func=bench_sense_keys)
+
+    duplicates_args = subparsers.add_parser(
+        "duplicates", help="Compare finding duplicate relations with a "
+        "Counter and in a single pass")
+    duplicates_args.add_argument("--file", default="wn.xml",
+                                 help="The XML file to check")
+    duplicates_args.add_argument("--duplicates", type=int, default=1000,
+                                 help="The number of synsets to add a "
+                                 "duplicate relation to")
+    duplicates_args.set_defaults(func=bench_duplicates)
+
+    transitive_args = subparsers.add_parser(
+        "transitive", help="Compare the transitive hypernym checks with "
+        "scanning the relations and walking the ancestors")
+    transitive_args.add_argument("--file", default="wn.xml",
+                                 help="The XML file to check")
+    transitive_args.add_argument("--edges", type=int, default=1000,
+                                 help="The number of redundant hypernyms "
+                                 "to add")
+    transitive_args.set_defaults(func=bench_transitive)
+
+    hypernyms_args = subparsers.add_parser(
+        "hypernyms", help="Compare the hypernym index with walking the "
+        "hierarchy")
+    hypernyms_args.add_argument("--file", default="wn.xml",
+                                help="The XML file to load")
+    hypernyms_args.add_argument("--synsets", type=int, default=3000,
+                                help="The number of random synsets to check")
+    hypernyms_args.set_defaults(func=bench_hypernyms)
+
+    sense_index_args = subparsers.add_parser(
+        "sense-index", help="Compare the sense indexes with scanning the "
+        "entries, after loading and after editing the senses")
+    sense_index_args.add_argument("--file", default="wn.xml",
+                                  help="The XML file to load")
+    sense_index_args.add_argument("--edits", type=int, default=2000,
+                                  help="The number of random edits to make")
+    sense_index_args.set_defaults(func=bench_sense_index)
+
+    similarity_args = subparsers.add_parser(
+        "similarity", help="Time the similarity measures")
+    similarity_args.add_argument("--file", default="wn.xml",
+                                 help="The XML file to load")
+    similarity_args.add_argument("--pairs", type=int, default=200000,
+                                 help="The number of random noun pairs")
+    similarity_args.add_argument("--ic-cache", default="/tmp/wn-ic.pickle",
+                                 help="Where to cache the information "
+                                 "content")
+    similarity_args.set_defaults(func=bench_similarity)
+
+    lemmas_args = subparsers.add_parser(
+        "lemmas", help="Time looking up surface forms")
+    lemmas_args.add_argument("--file", default="wn.xml",
+                             help="The XML file to load")
+    lemmas_args.add_argument("--tokens", type=int, default=1000000,
+                             help="The number of random tokens")
+    lemmas_args.set_defaults(func=bench_lemmas)
+
+    search_args = subparsers.add_parser(
+        "search", help="Time prefix and fuzzy lemma search")
+    search_args.add_argument("--file", default="wn.xml",
+                             help="The XML file to load")
+    search_args.add_argument("--output", default="/tmp/wn-search.pickle",
+                             help="Where to save the index")
+    search_args.add_argument("--distance", type=int, default=2,
+                             help="The maximum edit distance")
+    search_args.add_argument("--queries", type=int, default=10000,
+                             help="The number of queries")
+    search_args.add_argument("--checks", type=int, default=20,
+                             help="The number of fuzzy queries to check "
+                             "against every key")
+    search_args.set_defaults(func=bench_search)
+
+    text_args = subparsers.add_parser(
+        "text", help="Time searching definitions and examples")
+    text_args.add_argument("--file", default="wn.xml",
+                           help="The XML file to load")
+    text_args.add_argument("--output", default="/tmp/wn-text.pickle",
+                           help="Where to save the index")
+    text_args.add_argument("--queries", type=int, default=1000,
+                           help="The number of queries")
+    text_args.add_argument("--scans", type=int, default=10,
+                           help="The number of queries to answer by "
+                           "scanning every synset")
+    text_args.add_argument("--edits", type=int, default=200,
+                           help="The number of synsets to edit")
+    text_args.set_defaults(func=bench_text)
+
+    expand_args = subparsers.add_parser(
+        "expand", help="Time expanding many synsets over relations")
+    expand_args.add_argument("--file", default="wn.xml",
+                             help="The XML file to load")
+    expand_args.add_argument("--seeds", type=int, default=2000,
+                             help="The number of seed synsets")
+    expand_args.add_argument("--hops", type=int, default=3,
+                             help="The largest number of hops")
+    expand_args.set_defaults(func=bench_expand)
+
+    cache_args = subparsers.add_parser(
+        "cache", help="Compare cached and uncached queries")
+    cache_args.add_argument("--file", default="wn.xml",
+                            help="The XML file to load")
+    cache_args.add_argument("--queries", type=int, default=100000,
+                            help="The number of queries of each kind")
+    cache_args.add_argument("--maxsize", type=int, default=10000,
+                            help="The number of results to cache")
+    cache_args.add_argument("--hops", type=int, default=2,
+                            help="The number of hops to expand")
+    cache_args.set_defaults(func=bench_cache)
+
+    verify_arango_args = subparsers.add_parser(
+        "verify-arango", help="Check the ArangoDB graph verifier against "
+        "an in-memory stand-in database")
+    verify_arango_args.add_argument("--file", default="wn.xml",
+                                    help="The XML file to load")
+    verify_arango_args.add_argument("--sample", type=float, default=0.1,
+                                    help="The fraction of documents to "
+                                    "sample in the second run")
+    verify_arango_args.set_defaults(func=bench_verify_arango)
+
+    arango_closure_args = subparsers.add_parser(
+        "arango-closure", help="Check the hypernym closure of the ArangoDB "
+        "graph on a small DAG in a stand-in database")
+    arango_closure_args.add_argument("--output", default="/tmp/wn-dag.xml",
+                                     help="Where to write the XML of the DAG")
+    arango_closure_args.set_defaults(func=bench_arango_closure)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,12 @@
 from wordnet import *
 import pickle
 import os
+import json
 from glob import glob
 import fileinput
+import re
+import subprocess
+import yaml
 import hashlib
 from merge import wn_merge
 import wordnet_yaml
@@ -18,8 +22,16 @@ class ChangeList:
     def __init__(self):
         self.lexfiles = set()
         self.entry_files = set()
+        # The IDs of the changed entries and synsets, used to validate only
+        # the part of the wordnet around the changes
+        self.entries = set()
+        self.synsets = set()
+        # Called with no arguments after each change, e.g., to invalidate a
+        # wordnet_query.QueryCache
+        self.listeners = []
 
     def change_entry(self, wn, entry):
+        self.entries.add(entry.id)
         for sense in entry.senses:
             synset = wn.synset_by_id(sense.synset)
             self.lexfiles.add(synset.lex_name)
@@ -27,9 +39,115 @@ class ChangeList:
         if entry_key < 'a' or entry_key > 'z':
             entry_key = '0'
         self.entry_files.add(entry_key)
+        self.notify()
 
     def change_synset(self, synset):
         self.lexfiles.add(synset.lex_name)
+        self.synsets.add(synset.id)
+        self.notify()
+
+    def notify(self):
+        for listener in self.listeners:
+            listener()
+
+
+diff_file_re = re.compile(r"^\+\+\+ b/src/yaml/(.*)\.yaml$")
+# The old name, which is the only one given for a deleted file
+diff_old_file_re = re.compile(r"^--- a/src/yaml/(.*)\.yaml$")
+diff_hunk_re = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def top_level_start(lines, n):
+    """The index of the line of the top-level key whose value contains the
+    (1-based) line number n, or -1 if there is none"""
+    i = min(n, len(lines)) - 1
+    while i >= 0 and (not lines[i].strip() or lines[i][0] in " -#"):
+        i -= 1
+    return i
+
+
+def top_level_keys(lines, line_numbers):
+    """The top-level keys of a YAML file whose values contain the given
+    (1-based) line numbers"""
+    keys = set()
+    for n in line_numbers:
+        i = top_level_start(lines, n)
+        if i >= 0:
+            keys.update(str(k) for k in yaml.safe_load(lines[i]))
+    return keys
+
+
+def top_level_values(lines, line_numbers):
+    """The top-level keys of a YAML file whose values contain the given
+    (1-based) line numbers, with their values"""
+    starts = set(top_level_start(lines, n) for n in line_numbers)
+    values = {}
+    for i in sorted(starts - {-1}):
+        j = i + 1
+        while j < len(lines) and (not lines[j].strip()
+                                  or lines[j][0] in " -#"):
+            j += 1
+        block = yaml.safe_load("\n".join(line.rstrip("\n")
+                                         for line in lines[i:j]))
+        values.update((str(k), v) for k, v in block.items())
+    return values
+
+
+def changes_since(wn, rev="HEAD"):
+    """The ChangeList of the entries and synsets changed in src/yaml since
+    a git revision (including uncommitted changes). Keys that were only in
+    the old version are included so that references to deleted synsets are
+    checked"""
+    diff = subprocess.run(["git", "diff", "-U0", rev, "--", "src/yaml"],
+                          capture_output=True, text=True, check=True).stdout
+    changed = defaultdict(lambda: ([], []))
+    name = None
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            name = None
+            continue
+        m = diff_old_file_re.match(line) or diff_file_re.match(line)
+        if m:
+            name = m.group(1)
+            continue
+        m = diff_hunk_re.match(line)
+        if m and name:
+            old_start, old_len, new_start, new_len = m.groups()
+            old_start = int(old_start)
+            old_len = 1 if old_len is None else int(old_len)
+            new_start = int(new_start)
+            new_len = 1 if new_len is None else int(new_len)
+            old, new = changed[name]
+            old.extend(range(old_start, old_start + old_len))
+            new.extend(range(new_start, new_start + max(new_len, 1)))
+
+    change_list = ChangeList()
+    for name, (old, new) in changed.items():
+        keys = set()
+        if os.path.exists("src/yaml/%s.yaml" % name):
+            with open("src/yaml/%s.yaml" % name) as f:
+                keys = top_level_keys(f.readlines(), new)
+        old_values = {}
+        if old:
+            old_file = subprocess.run(
+                ["git", "show", "%s:src/yaml/%s.yaml" % (rev, name)],
+                capture_output=True, text=True).stdout
+            old_values = top_level_values(old_file.splitlines(), old)
+            keys |= set(old_values)
+        if name.startswith("entries-"):
+            change_list.entry_files.add(name[8:])
+            for lemma in keys:
+                for entry_id in wn.entry_by_lemma(lemma) or ():
+                    change_list.change_entry(wn, wn.entry_by_id(entry_id))
+            # The synsets of the old senses, which may have lost a member
+            for by_pos in old_values.values():
+                for props in by_pos.values():
+                    for sense in props.get("sense", ()):
+                        change_list.synsets.add("oewn-" + sense["synset"])
+        elif name != "frames":
+            change_list.lexfiles.add(name)
+            change_list.synsets.update("oewn-" + key for key in keys)
+    return change_list
 
 
 def load_wordnet():
@@ -73,7 +191,10 @@ def save(wn, change_list=None):
     pickle.dump(wn, open("wn.pickle", "wb"))
 
 
-def save_all_xml(wn, change_list=None):
+def split_by_lexfile(wn):
+    """Split the wordnet into a lexicon for each lexfile, as saved in
+    src/xml. Each entry is in the lexfiles of its senses with just the
+    senses in that lexfile"""
     by_lex_name = {}
     for synset in wn.synsets:
         if synset.lex_name not in by_lex_name:
@@ -85,107 +206,161 @@ def save_all_xml(wn, change_list=None):
         by_lex_name[synset.lex_name].add_synset(synset)
 
     for entry in wn.entries:
-        sense_no = dict([(e.id, i) for i, e in enumerate(entry.senses)])
-        for lex_name in by_lex_name.keys():
-            senses = [
-                sense for sense in entry.senses if wn.synset_by_id(
-                    sense.synset).lex_name == lex_name]
-            if senses:
-                e = LexicalEntry(entry.id)
-                e.set_lemma(entry.lemma)
-                for f in entry.forms:
-                    e.add_form(f)
-                for s in senses:
-                    s.n = sense_no[s.id]
-                    e.add_sense(s)
-
-                #def find_sense_for_sb(sb_sense):
-                #    for sense2 in senses:
-                #        if sense2.id == sb_sense:
-                #            return sense2.id
-                #    return None
-                #e.syntactic_behaviours = [SyntacticBehaviour(
-                #    sb.subcategorization_frame,
-                #    [find_sense_for_sb(sense) for sense in sb.senses])
-                #    for sb in entry.syntactic_behaviours]
-                #e.syntactic_behaviours = [SyntacticBehaviour(
-                #    sb.subcategorization_frame, [s for s in sb.senses if s])
-                #    for sb in e.syntactic_behaviours if any(sb.senses)]
-                e.pronunciation = entry.pronunciation
-                by_lex_name[lex_name].add_entry(e)
+        by_entry_lex_name = {}
+        for sense in entry.senses:
+            lex_name = wn.synset_by_id(sense.synset).lex_name
+            by_entry_lex_name.setdefault(lex_name, []).append(sense)
+        for lex_name, senses in by_entry_lex_name.items():
+            e = LexicalEntry(entry.id)
+            e.set_lemma(entry.lemma)
+            for f in entry.forms:
+                e.add_form(f)
+            for s in senses:
+                e.add_sense(s)
+            e.pronunciation = entry.pronunciation
+            by_lex_name[lex_name].add_entry(e)
+    return by_lex_name
+
+
+def save_all_xml(wn, change_list=None):
+    for entry in wn.entries:
+        for i, sense in enumerate(entry.senses):
+            sense.n = i
+    by_lex_name = split_by_lexfile(wn)
 
     for lex_name, wn in by_lex_name.items():
         if os.path.exists(
                 "src/xml/wn-%s.xml" %
                 lex_name) and (
                 not change_list or lex_name in change_list.lexfiles):
-            wn_lex = parse_wordnet("src/xml/wn-%s.xml" % lex_name)
-            wn.comments = wn_lex.comments
-            entry_order = defaultdict(
-                lambda: 10000000, [
-                    (e, i) for i, e in enumerate(
-                        entry.id for entry in wn_lex.entries)])
-            wn.entries = sorted(wn.entries, key=lambda e: entry_order[e.id])
-            for entry in wn.entries:
-                if wn_lex.entry_by_id(entry.id):
-                    sense_order = defaultdict(
-                        lambda: 10000, [
-                            (e, i) for i, e in enumerate(
-                                sense.id for sense in wn_lex.entry_by_id(
-                                    entry.id).senses)])
-                    entry.senses = sorted(
-                        entry.senses, key=lambda s: sense_order[s.id])
-                    # This is a bit of a hack as some of the n values are not
-                    # continguous
-                    for sense in entry.senses:
-                        if wn_lex.sense_by_id(sense.id):
-                            sense.n = wn_lex.sense_by_id(sense.id).n
-                            sense_rel_order = defaultdict(
-                                lambda: 10000, [
-                                    ((sr.target, sr.rel_type), i) for i, sr in enumerate(
-                                        wn_lex.sense_by_id(
-                                            sense.id).sense_relations)])
-                            sense.sense_relations = sorted(
-                                sense.sense_relations, key=lambda sr: sense_rel_order[(sr.target, sr.rel_type)])
-                        else:
-                            print("sense not found:" + sense.id)
-                    #sb_order = defaultdict(
-                    #    lambda: 10000, [
-                    #        (e, i) for i, e in enumerate(
-                    #            sb.subcategorization_frame for sb in wn_lex.entry_by_id(
-                    #                entry.id).syntactic_behaviours)])
-                    #entry.syntactic_behaviours = sorted(
-                    #    entry.syntactic_behaviours, key=lambda sb: sb_order[sb.subcategorization_frame])
-                    #for sb in entry.syntactic_behaviours:
-                    #    sb2s = [sb2 for sb2 in wn_lex.entry_by_id(entry.id).syntactic_behaviours
-                    #            if sb2.subcategorization_frame == sb.subcategorization_frame]
-                    #    if sb2s:
-                    #        sbe_order = defaultdict(
-                    #            lambda: 10000, [
-                    #                (e, i) for i, e in enumerate(
-                    #                    sb2s[0].senses)])
-                    #        sb.senses = sorted(
-                    #            sb.senses, key=lambda s: sbe_order[s])
-                else:
-                    print("not found:" + entry.id)
-            synset_order = defaultdict(
-                lambda: 1000000, [
-                    (e, i) for i, e in enumerate(
-                        synset.id for synset in wn_lex.synsets)])
-            wn.synsets = sorted(wn.synsets, key=lambda s: synset_order[s.id])
-            for synset in wn.synsets:
-                if wn_lex.synset_by_id(synset.id):
-                    synset_rel_order = defaultdict(
-                        lambda: 10000, [
-                            ((sr.target, sr.rel_type), i) for i, sr in enumerate(
-                                wn_lex.synset_by_id(
-                                    synset.id).synset_relations)])
-                    synset.synset_relations = sorted(
-                        synset.synset_relations, key=lambda sr: synset_rel_order[(sr.target, sr.rel_type)])
+            LexfileOrder.load(lex_name).apply(wn)
         if not change_list or lex_name in change_list.lexfiles:
             Path("src/xml").mkdir(parents=True, exist_ok=True)
             with codecs.open("src/xml/wn-%s.xml" % lex_name, "w", "utf-8") as outp:
                 wn.to_xml(outp, True)
+            LexfileOrder.from_lexicon(wn).save(lex_name)
+
+
+class LexfileOrder:
+    """The order of the entries, senses, synsets and relations and the
+    comments of a lexfile XML. This is written next to the XML as
+    src/xml/wn-<lexfile>.order.json whenever the XML is saved, so the next
+    save can restore the order without parsing the XML again"""
+
+    def __init__(self, entries, synsets, comments):
+        # [(entry_id, [(sense_id, n, [(target, rel_type), ...]), ...]), ...]
+        self.entries = entries
+        # [(synset_id, [(target, rel_type), ...]), ...]
+        self.synsets = synsets
+        self.comments = comments
+
+    @staticmethod
+    def from_lexicon(wn_lex):
+        entries = [
+            (entry.id, [
+                (sense.id, sense.n, [
+                    (sr.target, sr.rel_type.value)
+                    for sr in sense.sense_relations])
+                for sense in entry.senses])
+            for entry in wn_lex.entries]
+        synsets = [
+            (synset.id, [(sr.target, sr.rel_type.value)
+                         for sr in synset.synset_relations])
+            for synset in wn_lex.synsets]
+        # Only the comments that are written to the XML
+        ids = set(synset_id for synset_id, _ in synsets)
+        ids.update(target for _, rels in synsets for target, _ in rels)
+        ids.update(target for _, senses in entries
+                   for _, _, rels in senses for target, _ in rels)
+        comments = {k: v for k, v in wn_lex.comments.items() if k in ids}
+        return LexfileOrder(entries, synsets, comments)
+
+    @staticmethod
+    def sidecar_file(lex_name):
+        return "src/xml/wn-%s.order.json" % lex_name
+
+    @staticmethod
+    def load(lex_name):
+        """Read the order for a lexfile from its sidecar, or from the XML if
+        the sidecar is missing or was not written for the current XML"""
+        xml_file = "src/xml/wn-%s.xml" % lex_name
+        sidecar = LexfileOrder.sidecar_file(lex_name)
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as inp:
+                data = json.load(inp)
+            stat = os.stat(xml_file)
+            if data["xml"] == [stat.st_size, stat.st_mtime_ns]:
+                return LexfileOrder(data["entries"], data["synsets"],
+                                    data["comments"])
+        return LexfileOrder.from_lexicon(parse_wordnet_cached(xml_file))
+
+    def save(self, lex_name):
+        stat = os.stat("src/xml/wn-%s.xml" % lex_name)
+        with open(LexfileOrder.sidecar_file(lex_name), "w",
+                  encoding="utf-8") as outp:
+            json.dump({"xml": [stat.st_size, stat.st_mtime_ns],
+                       "entries": self.entries,
+                       "synsets": self.synsets,
+                       "comments": self.comments},
+                      outp, separators=(",", ":"), ensure_ascii=False)
+
+    def apply(self, wn):
+        """Sort the entries, senses, synsets and relations of the lexicon
+        into this order"""
+        wn.comments = self.comments
+        entry_order = defaultdict(
+            lambda: 10000000, [
+                (e, i) for i, (e, _) in enumerate(self.entries)])
+        wn.entries = sorted(wn.entries, key=lambda e: entry_order[e.id])
+        entry_senses = dict(self.entries)
+        sense_n = {}
+        sense_rels = {}
+        for senses in entry_senses.values():
+            for sense_id, n, rels in senses:
+                sense_n[sense_id] = n
+                sense_rels[sense_id] = rels
+        for entry in wn.entries:
+            if entry.id in entry_senses:
+                sense_order = defaultdict(
+                    lambda: 10000, [
+                        (e, i) for i, (e, _, _) in enumerate(
+                            entry_senses[entry.id])])
+                entry.senses = sorted(
+                    entry.senses, key=lambda s: sense_order[s.id])
+                # This is a bit of a hack as some of the n values are not
+                # continguous
+                for sense in entry.senses:
+                    if sense.id in sense_n:
+                        sense.n = sense_n[sense.id]
+                        sense_rel_order = defaultdict(
+                            lambda: 10000, [
+                                ((target, rel_type), i)
+                                for i, (target, rel_type) in enumerate(
+                                    sense_rels[sense.id])])
+                        sense.sense_relations = sorted(
+                            sense.sense_relations,
+                            key=lambda sr: sense_rel_order[
+                                (sr.target, sr.rel_type.value)])
+                    else:
+                        print("sense not found:" + sense.id)
+            else:
+                print("not found:" + entry.id)
+        synset_order = defaultdict(
+            lambda: 1000000, [
+                (e, i) for i, (e, _) in enumerate(self.synsets)])
+        wn.synsets = sorted(wn.synsets, key=lambda s: synset_order[s.id])
+        synset_rels = dict(self.synsets)
+        for synset in wn.synsets:
+            if synset.id in synset_rels:
+                synset_rel_order = defaultdict(
+                    lambda: 10000, [
+                        ((target, rel_type), i)
+                        for i, (target, rel_type) in enumerate(
+                            synset_rels[synset.id])])
+                synset.synset_relations = sorted(
+                    synset.synset_relations,
+                    key=lambda sr: synset_rel_order[
+                        (sr.target, sr.rel_type.value)])
 
 
 def delete_rel(source, target, change_list=None):
@@ -283,8 +458,7 @@ def change_entry(wn, synset, target_synset, lemma, change_list=None):
                      target_synset.part_of_speech.value,
                      synset_key(
                         target_synset.id),
-                        idx),
-                    change_list)
+                        idx))
     if change_list:
         change_list.change_entry(wn, entry)
 
@@ -351,12 +525,8 @@ def add_entry(wn, synset, lemma, idx=0, n=-1, change_list=None):
             n=n,
             sense_key=None)
 
-        wn_entry.senses.append(sense)
-        entry.senses.append(sense)
+        wn.add_sense(wn_entry, sense)
         sense.sense_key = get_sense_key(wn, entry, sense, synset.lex_name)
-        if sense.synset not in wn.members:
-            wn.members[sense.synset] = []
-        wn.members[sense.synset].append(wn_entry.lemma.written_form)
     else:
         n = 0
         print("Creating new entry")
@@ -527,10 +697,7 @@ def change_sense_idx(wn, sense_id, new_idx, change_list=None):
 
 
 def sense_ids_for_synset(wn, synset):
-    return [sense.id for lemma in wn.members_by_id(synset.id)
-            for entry in wn.entry_by_lemma(lemma)
-            for sense in wn.entry_by_id(entry).senses
-            if sense.synset == synset.id]
+    return [sense.id for sense in wn.senses_by_synset(synset.id)]
 
 
 def new_id(wn, pos, definition):
@@ -579,14 +746,14 @@ def merge_synset(wn, synsets, reason, lexfile, ssid=None, change_list=None):
                     wn, ss, wn.synset_by_id(
                         r.target), r.rel_type, change_list)
         # Add members
-        for m in wn.members_by_id(s.id):
+        for sense in list(wn.senses_by_synset(s.id)):
+            e = wn.entry_by_sense(sense.id)
+            m = e.lemma.written_form
             if m not in members:
-                members[m] = add_entry(wn, ss, m, change_list)
-                add_entry(wn, ss, m, change_list)
-            e = [e for e in [wn.entry_by_id(e2) for e2 in wn.entry_by_lemma(m)]
-                 if e.lemma.part_of_speech.value == pos][0]
+                members[m] = add_entry(wn, ss, m, change_list=change_list)
             for f in e.forms:
-                if not any(f2 == f for f in members[m].forms):
+                if not any(f2.written_form == f.written_form
+                           for f2 in members[m].forms):
                     members[m].add_form(f)
             # syn behaviours - probably fix manually for the moment
     if change_list:
@@ -774,7 +941,7 @@ def sense_exists(wn, sense_id):
     return False
 
 
-def update_def(wn, synset, defn, add, change_list=None):
+def update_def(wn, synset, defn, add, change_list=None, text_index=None):
     wn_synset = wn
     ss = wn_synset.synset_by_id(synset.id)
     if add:
@@ -783,6 +950,8 @@ def update_def(wn, synset, defn, add, change_list=None):
         ss.definitions = [Definition(defn)]
     if change_list:
         change_list.change_synset(synset)
+    if text_index:
+        text_index.update_synset(ss)
 
 
 def update_ili_def(wn, synset, defn, change_list=None):
@@ -793,15 +962,17 @@ def update_ili_def(wn, synset, defn, change_list=None):
         change_list.change_synset(synset)
 
 
-def add_ex(wn, synset, example, change_list=None):
+def add_ex(wn, synset, example, change_list=None, text_index=None):
     wn_synset = wn
     ss = wn_synset.synset_by_id(synset.id)
     ss.examples = ss.examples + [Example(example)]
     if change_list:
         change_list.change_synset(synset)
+    if text_index:
+        text_index.update_synset(ss)
 
 
-def delete_ex(wn, synset, example, change_list=None):
+def delete_ex(wn, synset, example, change_list=None, text_index=None):
     wn_synset = wn
     ss = wn_synset.synset_by_id(synset.id)
     n_exs = len(ss.examples)
@@ -810,3 +981,5 @@ def delete_ex(wn, synset, example, change_list=None):
         print("No change")
     if change_list:
         change_list.change_synset(synset)
+    if text_index:
+        text_index.update_synset(ss)
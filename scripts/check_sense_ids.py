@@ -5,13 +5,7 @@ from wordnet import *
 wn = parse_wordnet("wn.xml")
 
 for synset in wn.synsets:
-    members = wn.members_by_id(synset.id)
-    senses = [
-        [sense for entry in wn.entry_by_lemma(member)
-         for sense in wn.entry_by_id(entry).senses
-         if sense.synset == synset.id][0]
-        for member in members]
-    senses = sorted(senses, key=lambda s: s.id[-2:])
+    senses = sorted(wn.senses_by_synset(synset.id), key=lambda s: s.id[-2:])
     actual = sorted([s.id[-2:] for s in senses])
     if actual[0] == '00':
         goal = ["%02d" % i for i in range(len(senses))]
@@ -81,7 +81,21 @@ def gen_lex_id(e, s):
 
 
 def extract_lex_id(sense_key):
-    return int(re.match(sense_id_lex_id, sense_key).group(1))
+    return int(sense_id_lex_id.match(sense_key).group(1))
+
+
+def sense_id_to_lex_id(sense_id):
+    """The lex ID of a sense from its ID, as extract_lex_id(unmap_sense_key(
+    sense_id)) but reading it directly from IDs such as
+    oewn-dog__1.05.00.."""
+    parts = sense_id.split("__", 1)
+    if len(parts) == 2:
+        fields = parts[1].split(".")
+        if (len(fields) > 2 and len(fields[0]) == 1 and len(fields[1]) == 2
+                and len(fields[2]) == 2 and fields[2].isdigit()
+                and fields[0].isdigit() and fields[1].isdigit()):
+            return int(fields[2])
+    return extract_lex_id(unmap_sense_key(sense_id))
 
 
 def sense_for_entry_synset_id(wn, ss_id, lemma):
@@ -119,16 +133,23 @@ def get_head_word(wn, s):
     exit(-1)
 
 
-def get_sense_key(wn, e, s, wn_file):
-    """Calculate the sense key for a sense of an entry"""
-    ss = wn.synset_by_id(s.synset)
-    lemma = e.lemma.written_form.replace(
+def sense_key_lemma(lemma):
+    return lemma.replace(
         " ", "_").replace(
         "&apos", "'").replace("+", "-pl-").lower()
-    ss_type = ss_types[ss.part_of_speech]
+
+
+def lex_filenum(wn_file):
     if not wn_file.startswith("src/xml/wn-"):
         wn_file = f"src/xml/wn-{wn_file}.xml"
-    lex_filenum = lex_filenums[wn_file]
+    return lex_filenums[wn_file]
+
+
+def get_sense_key(wn, e, s, wn_file):
+    """Calculate the sense key for a sense of an entry"""
+    ss = wn.synset_by_id(s.synset)
+    lemma = sense_key_lemma(e.lemma.written_form)
+    ss_type = ss_types[ss.part_of_speech]
     if s.id:
         lex_id = extract_lex_id(unmap_sense_key(s.id))
     else:
@@ -138,5 +159,67 @@ def get_sense_key(wn, e, s, wn_file):
     else:
         head_word = ""
         head_id = ""
-    return "%s%%%d:%02d:%02d:%s:%s" % (lemma, ss_type, lex_filenum,
+    return "%s%%%d:%02d:%02d:%s:%s" % (lemma, ss_type, lex_filenum(wn_file),
                                        lex_id, head_word, head_id)
+
+
+class SenseKeyCalculator:
+    """Calculates the sense keys of many senses, as get_sense_key does, but
+    remembers the head word of each satellite synset, the lemma of each
+    entry and the lex ID of senses without a key in each entry, as these
+    are shared by many senses"""
+
+    def __init__(self, wn):
+        self.wn = wn
+        self.head_words = {}
+        self.lemmas = {}
+        self.new_lex_ids = {}
+        self.lex_filenums = {}
+
+    def head_word(self, s):
+        if s.synset not in self.head_words:
+            self.head_words[s.synset] = get_head_word(self.wn, s)
+        return self.head_words[s.synset]
+
+    def lemma(self, e):
+        if e.id not in self.lemmas:
+            self.lemmas[e.id] = sense_key_lemma(e.lemma.written_form)
+        return self.lemmas[e.id]
+
+    def new_lex_id(self, e, s):
+        # gen_lex_id gives every sense without a key the same lex ID. The
+        # entry is kept with the result, as entries split by lexfile share
+        # the ID of the whole entry
+        key = id(e)
+        if key not in self.new_lex_ids:
+            self.new_lex_ids[key] = (e, gen_lex_id(e, s))
+        return self.new_lex_ids[key][1]
+
+    def sense_key(self, e, s, wn_file):
+        ss = self.wn.synset_by_id(s.synset)
+        if s.id:
+            lex_id = sense_id_to_lex_id(s.id)
+        else:
+            lex_id = self.new_lex_id(e, s)
+        if wn_file not in self.lex_filenums:
+            self.lex_filenums[wn_file] = lex_filenum(wn_file)
+        if ss.part_of_speech == PartOfSpeech.ADJECTIVE_SATELLITE:
+            head_word, head_id = self.head_word(s)
+        else:
+            head_word = ""
+            head_id = ""
+        return "%s%%%d:%02d:%02d:%s:%s" % (
+            self.lemma(e), ss_types[ss.part_of_speech],
+            self.lex_filenums[wn_file],
+            lex_id, head_word, head_id)
+
+
+def get_sense_keys(wn, lexfiles):
+    """Calculate the sense keys of all senses in the lexfiles, given as a
+    dictionary from the lexfile name to its lexicon. Yields each entry and
+    sense with its sense key"""
+    calculator = SenseKeyCalculator(wn)
+    for lexfile, lexicon in lexfiles.items():
+        for entry in lexicon.entries:
+            for sense in entry.senses:
+                yield entry, sense, calculator.sense_key(entry, sense, lexfile)
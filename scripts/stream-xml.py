@@ -0,0 +1,18 @@
+import argparse
+import codecs
+import wordnet_yaml
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the complete wordnet as XML directly from the YAML sources")
+    parser.add_argument('--output', type=str, default="wn.xml",
+                        help="The file to write the XML to")
+    args = parser.parse_args()
+
+    with codecs.open(args.output, "w", "utf-8") as outp:
+        wordnet_yaml.stream_xml(outp, True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,117 +2,492 @@ from wordnet import *
 import re
 import sys
 import glob
+import time
+import argparse
+import contextlib
+import json
+import multiprocessing
 import sense_keys
-from collections import Counter
+import change_manager
+import wordnet_yaml
+from functools import cached_property
 from sense_keys import unmap_sense_key
 
-def check_symmetry(wn, fix):
+
+class ValidationIndex:
+    """Lookups over the lexicon shared by the validation rules. Each is
+    computed the first time it is used. The lexfiles are read from src/xml
+    unless the lexicon is split into lexfiles in memory, as when it is
+    loaded from YAML"""
+
+    def __init__(self, wn, lexfiles_from_xml=True):
+        self.wn = wn
+        self.lexfiles_from_xml = lexfiles_from_xml
+        # The synsets to search for loops through, or None to search the
+        # whole lexicon
+        self.changed_synsets = None
+
+    @cached_property
+    def synset_triples(self):
+        return synset_relation_triples(self.wn)
+
+    @cached_property
+    def sense_triples(self):
+        return sense_relation_triples(self.wn)
+
+    @cached_property
+    def hypernyms(self):
+        return hypernym_lists(self.wn)
+
+    @cached_property
+    def lexfiles(self):
+        if self.lexfiles_from_xml:
+            return {f[11:-4]: parse_wordnet_cached(f)
+                    for f in glob.glob("src/xml/wn-*.xml")}
+        else:
+            return change_manager.split_by_lexfile(self.wn)
+
+    @cached_property
+    def hypernym_sets(self):
+        return {k: set(v) for k, v in self.hypernyms.items()}
+
+    @cached_property
+    def duplicate_sense_keys(self):
+        # Always over the whole lexicon, so that the senses of a
+        # neighbourhood are compared with the keys of all the others
+        if isinstance(self.wn, LexiconView):
+            return duplicate_sense_keys(self.wn.wn)
+        return duplicate_sense_keys(self.wn)
+
+
+class LexiconView:
+    """Part of a lexicon: the synsets and entries to be checked. All other
+    attributes, including the lookups by ID, are those of the whole
+    lexicon"""
+
+    def __init__(self, wn, synsets, entries):
+        self.wn = wn
+        self.synsets = synsets
+        self.entries = entries
+
+    def __getattr__(self, name):
+        return getattr(self.wn, name)
+
+
+class Neighbourhood:
+    """The synsets and senses within a number of hops of the changed
+    entries and synsets, following relations in either direction"""
+
+    def __init__(self, wn, change_list, hops=1):
+        self.wn = wn
+        # Incoming relations are only found by looking at every relation
+        incoming = {}
+        for synset in wn.synsets:
+            for rel in synset.synset_relations:
+                incoming.setdefault(rel.target, []).append(synset.id)
+        sense_entry = {}
+        incoming_senses = {}
+        for entry in wn.entries:
+            for sense in entry.senses:
+                sense_entry[sense.id] = entry.id
+                for rel in sense.sense_relations:
+                    incoming_senses.setdefault(rel.target, []).append(
+                        sense.id)
+
+        self.changed_synsets = set(change_list.synsets)
+        changed_senses = set()
+        for entry_id in change_list.entries:
+            entry = wn.entry_by_id(entry_id)
+            if entry:
+                for sense in entry.senses:
+                    changed_senses.add(sense.id)
+                    self.changed_synsets.add(sense.synset)
+        # The members of a changed synset are checked against it
+        for synset_id in self.changed_synsets:
+            for sense in wn.senses_by_synset(synset_id):
+                changed_senses.add(sense.id)
+
+        synset_ids = self._expand(
+            self.changed_synsets, hops, incoming,
+            lambda s: wn.synset_by_id(s).synset_relations)
+        sense_ids = self._expand(
+            changed_senses, hops, incoming_senses,
+            lambda s: wn.id2sense[s].sense_relations)
+        self.synsets = [wn.synset_by_id(s) for s in sorted(synset_ids)
+                        if wn.synset_by_id(s)]
+        entry_ids = set(sense_entry[s] for s in sense_ids if s in sense_entry)
+        entry_ids.update(e for e in change_list.entries if wn.entry_by_id(e))
+        self.entries = [wn.entry_by_id(e) for e in sorted(entry_ids)]
+
+    @staticmethod
+    def _expand(nodes, hops, incoming, relations):
+        seen = set(nodes)
+        frontier = nodes
+        for _ in range(hops):
+            next_frontier = set()
+            for node in frontier:
+                try:
+                    targets = [rel.target for rel in relations(node)]
+                except (AttributeError, KeyError):
+                    # A deleted synset or sense
+                    targets = []
+                for target in targets + incoming.get(node, []):
+                    if target not in seen:
+                        seen.add(target)
+                        next_frontier.add(target)
+            frontier = next_frontier
+        return seen
+
+    def view(self):
+        return LexiconView(self.wn, self.synsets, self.entries)
+
+
+class LocalValidationIndex(ValidationIndex):
+    """The lookups for validating a neighbourhood. They cover the synsets
+    and senses of the neighbourhood and the targets of their relations,
+    which is all that the local rules look at"""
+
+    def __init__(self, neighbourhood):
+        super().__init__(neighbourhood.view())
+        self.changed_synsets = neighbourhood.changed_synsets
+        synsets = {}
+        for synset in self.wn.synsets:
+            synsets[synset.id] = synset
+            for rel in synset.synset_relations:
+                target = self.wn.synset_by_id(rel.target)
+                if target:
+                    synsets[target.id] = target
+        self.context_synsets = list(synsets.values())
+        senses = {}
+        for entry in self.wn.entries:
+            for sense in entry.senses:
+                senses[sense.id] = sense
+                for rel in sense.sense_relations:
+                    if rel.target in self.wn.id2sense:
+                        senses[rel.target] = self.wn.id2sense[rel.target]
+        self.context_senses = list(senses.values())
+
+    @cached_property
+    def synset_triples(self):
+        return set((synset.id, rel.rel_type, rel.target)
+                   for synset in self.context_synsets
+                   for rel in synset.synset_relations)
+
+    @cached_property
+    def sense_triples(self):
+        return set((sense.id, rel.rel_type, rel.target)
+                   for sense in self.context_senses
+                   for rel in sense.sense_relations)
+
+    @cached_property
+    def hypernyms(self):
+        return hypernym_lists(LexiconView(self.wn, self.context_synsets, []))
+
+
+def synset_relation_triples(wn):
+    """The set of all (source, rel_type, target) synset relations"""
+    return set((synset.id, rel.rel_type, rel.target)
+               for synset in wn.id2synset.values()
+               for rel in synset.synset_relations)
+
+
+def sense_relation_triples(wn):
+    """The set of all (source, rel_type, target) sense relations"""
+    return set((sense.id, rel.rel_type, rel.target)
+               for sense in wn.id2sense.values()
+               for rel in sense.sense_relations)
+
+
+def check_symmetry(wn, index=None):
+    index = index or ValidationIndex(wn)
     errors = []
+    synset_triples = index.synset_triples
     for synset in wn.synsets:
         for rel in synset.synset_relations:
-            if rel.rel_type in inverse_synset_rels:
-                synset2 = wn.synset_by_id(rel.target)
-                if not synset2:
+            inverse = inverse_synset_rels.get(rel.rel_type)
+            if inverse:
+                if rel.target not in wn.id2synset:
                     # This error only happens if the XML validation is not
                     # being carried out!
-                    print(
+                    errors.append(Finding(
                         "Referencing bad synset ID %s from %s" %
-                        (rel.target, synset.id))
-                else:
-                    if not any(r for r in synset2.synset_relations if r.target ==
-                               synset.id and r.rel_type == inverse_synset_rels[rel.rel_type]):
-                        if fix:
-                            errors.append("python3 scripts/change-relation.py --add --new-relation %s %s %s" % (
-                                inverse_synset_rels[rel.rel_type].value, synset2.id, synset.id))
-                        else:
-                            errors.append(
-                                "No symmetric relation for %s =%s=> %s" %
-                                (synset.id, rel.rel_type, synset2.id))
+                        (rel.target, synset.id), [synset.id, rel.target],
+                        severity="warning"))
+                elif (rel.target, inverse, synset.id) not in synset_triples:
+                    errors.append(Finding(
+                        "ERROR: No symmetric relation for %s =%s=> %s" %
+                        (synset.id, rel.rel_type, rel.target),
+                        [synset.id, rel.target],
+                        "python3 scripts/change-relation.py --add --new-relation %s %s %s" % (
+                            inverse.value, rel.target, synset.id)))
+    sense_triples = index.sense_triples
     for entry in wn.entries:
         for sense in entry.senses:
             for rel in sense.sense_relations:
-                if rel.rel_type in inverse_sense_rels:
-                    sense2 = wn.sense_by_id(rel.target)
-                    if not sense2:
-                        errors.append(
-                                "Reference to no existant sense %s)" % (rel.target))
+                inverse = inverse_sense_rels.get(rel.rel_type)
+                if inverse:
+                    if rel.target not in wn.id2sense:
+                        errors.append(Finding(
+                                "ERROR: Reference to no existant sense %s)" % (rel.target),
+                                [sense.id, rel.target]))
                         continue
-                    if not any(r for r in sense2.sense_relations if r.target ==
-                               sense.id and r.rel_type == inverse_sense_rels[rel.rel_type]):
-                        if fix:
-                            errors.append("python3 scripts/change-relation.py --add --new-relation %s %s %s" % (
-                                inverse_sense_rels[rel.rel_type].value, sense2.id, sense.id))
-                        else:
-                            errors.append(
-                                "No symmetric relation for %s =%s=> %s" %
-                                (sense.id, rel.rel_type, sense2.id))
+                    if (rel.target, inverse, sense.id) not in sense_triples:
+                        errors.append(Finding(
+                            "ERROR: No symmetric relation for %s =%s=> %s" %
+                            (sense.id, rel.rel_type, rel.target),
+                            [sense.id, rel.target],
+                            "python3 scripts/change-relation.py --add --new-relation %s %s %s" % (
+                                inverse.value, rel.target, sense.id)))
 
     return errors
 
 
-def check_transitive(wn, fix):
+def hypernym_lists(wn):
+    """The targets of the hypernym relations of each synset, in order"""
+    return {synset.id: [rel.target for rel in synset.synset_relations
+                        if rel.rel_type == SynsetRelType.HYPERNYM]
+            for synset in wn.synsets}
+
+
+def check_transitive(wn, index=None):
+    index = index or ValidationIndex(wn)
     errors = []
+    hypernyms = index.hypernyms
+    hypernym_sets = index.hypernym_sets
     for synset in wn.synsets:
-        for rel in synset.synset_relations:
-            if rel.rel_type == SynsetRelType.HYPERNYM:
-                synset2 = wn.synset_by_id(rel.target)
-                for rel2 in synset2.synset_relations:
-                    if (any(r for r in synset.synset_relations if r.target ==
-                           rel2.target and r.rel_type == SynsetRelType.HYPERNYM) and
-                           rel2.rel_type == SynsetRelType.HYPERNYM):
-                        if fix:
-                            errors.append(
-                                "python scripts/change-relation.py --delete %s %s" %
-                                (synset.id, rel2.target))
-                        else:
-                            errors.append(
-                                "Transitive error for %s => %s => %s" %
-                                (synset.id, synset2.id, rel2.target))
+        parents = hypernym_sets[synset.id]
+        for target in hypernyms[synset.id]:
+            for grandparent in hypernyms.get(target, ()):
+                if grandparent in parents:
+                    errors.append(Finding(
+                        "ERROR: Transitive error for %s => %s => %s" %
+                        (synset.id, target, grandparent),
+                        [synset.id, target, grandparent],
+                        "python scripts/change-relation.py --delete %s %s" %
+                        (synset.id, grandparent)))
     return errors
 
-def check_no_loops(wn):
-    hypernyms = {}
+
+class AncestorBitsets:
+    """The transitive closure of a relation as bitsets. Synsets are numbered
+    by their depth in the hierarchy so that the bitsets of the ancestors of
+    a synset only use the low bits, and bitsets are computed when first
+    needed"""
+
+    def __init__(self, parents):
+        self.parents = parents
+        depth = {}
+        for node in parents:
+            self._depth(node, depth)
+        self.ids = {node: i for i, node in enumerate(
+            sorted(depth, key=lambda n: depth[n]))}
+        self.bitsets = {}
+
+    def _depth(self, root, depth):
+        # The longest path up to a root, found with an iterative DFS. A
+        # parent that is still in progress is on a loop and is ignored
+        if root in depth:
+            return
+        depth[root] = None
+        stack = [(root, iter(self.parents.get(root, ())))]
+        while stack:
+            node, parents = stack[-1]
+            for p in parents:
+                if p not in depth:
+                    depth[p] = None
+                    stack.append((p, iter(self.parents.get(p, ()))))
+                    break
+            else:
+                stack.pop()
+                depth[node] = 1 + max(
+                    (depth[p] for p in self.parents.get(node, ())
+                     if depth[p] is not None), default=-1)
+
+    def bit(self, node):
+        return 1 << self.ids[node]
+
+    def ancestors(self, node):
+        """The bitset of all (transitive) ancestors of node"""
+        if node not in self.bitsets:
+            bits = 0
+            seen = set()
+            stack = [node]
+            while stack:
+                for p in self.parents.get(stack.pop(), ()):
+                    if p not in seen:
+                        seen.add(p)
+                        bits |= 1 << self.ids[p]
+                        stack.append(p)
+            self.bitsets[node] = bits
+        return self.bitsets[node]
+
+
+def check_redundant_hypernyms(wn, index=None):
+    """Find hypernyms that are also the ancestor (at any depth) of another
+    hypernym of the same synset. check_transitive only finds these at depth
+    two"""
+    index = index or ValidationIndex(wn)
+    errors = []
+    hypernyms = index.hypernyms
+    closure = AncestorBitsets(hypernyms)
     for synset in wn.synsets:
-        hypernyms[synset.id] = set()
-        for rel in synset.synset_relations:
-            if rel.rel_type == SynsetRelType.HYPERNYM:
-                hypernyms[synset.id].add(rel.target)
-    changed = True
-    while changed:
-        changed = False
-        for synset in wn.synsets:
-            n_size = len(hypernyms[synset.id])
-            for c in hypernyms[synset.id]:
-                hypernyms[synset.id] = hypernyms[synset.id].union(
-                    hypernyms.get(c, []))
-                if synset.id in hypernyms[synset.id]:
-                    return ["Loop for %s <-> %s" % (synset.id, c)]
-            if len(hypernyms[synset.id]) != n_size:
-                changed = True
-    return []
+        parents = hypernyms[synset.id]
+        if len(parents) < 2:
+            continue
+        reachable = 0
+        for target in parents:
+            reachable |= closure.ancestors(target)
+        for target in parents:
+            if reachable & closure.bit(target):
+                via = [t for t in parents if t != target and
+                       closure.ancestors(t) & closure.bit(target)]
+                if not via:
+                    continue
+                errors.append(Finding(
+                    "ERROR: Redundant hypernym %s => %s (already reached via %s)" %
+                    (synset.id, target, via[0]), [synset.id, target, via[0]],
+                    "python scripts/change-relation.py --delete %s %s" %
+                    (synset.id, target)))
+    return errors
+
+
+def find_cycles(graph):
+    """Find the cycles in a directed graph given as a dict from each node to
+    the list of its targets. Returns one cycle (as a list of nodes) for each
+    strongly connected component that contains a cycle, using an iterative
+    version of Tarjan's algorithm so it runs in O(V+E)"""
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            node, targets = work[-1]
+            for target in targets:
+                if target not in index:
+                    index[target] = lowlink[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph.get(target, ()))))
+                    break
+                elif target in on_stack:
+                    lowlink[node] = min(lowlink[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in graph.get(node, ()):
+                        components.append(component)
+    return [cycle_in_component(graph, set(c), min(c)) for c in components]
 
-def check_no_domain_loops(wn):
-    domains = {}
+
+def cycle_in_component(graph, component, start):
+    """Find a cycle through start that stays within a strongly connected
+    component"""
+    parent = {start: None}
+    queue = [start]
+    for node in queue:
+        for target in graph.get(node, ()):
+            if target == start:
+                cycle = [node]
+                while parent[cycle[-1]] is not None:
+                    cycle.append(parent[cycle[-1]])
+                cycle.reverse()
+                return cycle + [start]
+            if target in component and target not in parent:
+                parent[target] = node
+                queue.append(target)
+    return [start]
+
+
+def relation_graph(wn, rel_types):
+    graph = {}
     for synset in wn.synsets:
-        domains[synset.id] = set()
-        for rel in synset.synset_relations:
-            if (rel.rel_type == SynsetRelType.DOMAIN_TOPIC or
-                rel.rel_type == SynsetRelType.DOMAIN_REGION or
-                rel.rel_type == SynsetRelType.EXEMPLIFIES):
-                domains[synset.id].add(rel.target)
-    changed = True
-    while changed:
-        changed = False
-        for synset in wn.synsets:
-            n_size = len(domains[synset.id])
-            for c in domains[synset.id]:
-                domains[synset.id] = domains[synset.id].union(
-                    domains.get(c, []))
-            if len(domains[synset.id]) != n_size:
-                changed = True
-            if synset.id in domains[synset.id]:
-                return ["Domain loop for %s" % (synset.id)]
-    return []
+        graph[synset.id] = [rel.target for rel in synset.synset_relations
+                            if rel.rel_type in rel_types]
+    return graph
+
+
+domain_rel_types = {SynsetRelType.DOMAIN_TOPIC,
+                    SynsetRelType.DOMAIN_REGION,
+                    SynsetRelType.EXEMPLIFIES}
+
+
+def check_no_loops(wn, index=None):
+    index = index or ValidationIndex(wn)
+    if index.changed_synsets is not None:
+        cycles = check_loops_through(wn, index.changed_synsets,
+                                     {SynsetRelType.HYPERNYM})
+    else:
+        cycles = find_cycles(index.hypernyms)
+    return [Finding("ERROR: Loop for %s" % " -> ".join(cycle),
+                    list(dict.fromkeys(cycle))) for cycle in cycles]
+
+def check_no_domain_loops(wn, index=None):
+    if index and index.changed_synsets is not None:
+        cycles = check_loops_through(wn, index.changed_synsets,
+                                     domain_rel_types)
+    else:
+        cycles = find_cycles(relation_graph(wn, domain_rel_types))
+    return [Finding("ERROR: Domain loop for %s" % " -> ".join(cycle),
+                    list(dict.fromkeys(cycle))) for cycle in cycles]
+
+def check_loops_through(wn, synset_ids, rel_types, limit=100000):
+    """Find the loops of the given relations that pass through one of the
+    synsets. A loop through a synset must return to it from one of its
+    ancestors, so only the ancestors are searched (at most limit synsets
+    from each one)"""
+    def targets(node):
+        synset = wn.synset_by_id(node)
+        if not synset:
+            return []
+        return [rel.target for rel in synset.synset_relations
+                if rel.rel_type in rel_types]
+
+    cycles = []
+    for start in sorted(synset_ids):
+        parent = {start: None}
+        queue = [start]
+        for node in queue:
+            if len(parent) > limit:
+                break
+            found = False
+            for target in targets(node):
+                if target == start:
+                    cycle = [node]
+                    while parent[cycle[-1]] is not None:
+                        cycle.append(parent[cycle[-1]])
+                    cycle.reverse()
+                    cycles.append(cycle + [start])
+                    found = True
+                    break
+                if target not in parent:
+                    parent[target] = node
+                    queue.append(target)
+            if found:
+                break
+    # The same loop is found from each of its changed synsets
+    unique = {}
+    for cycle in cycles:
+        unique.setdefault(frozenset(cycle), cycle)
+    return list(unique.values())
+
 
 def check_not_empty(wn, ss):
     if not wn.members_by_id(ss.id):
@@ -121,59 +496,50 @@ def check_not_empty(wn, ss):
         return True
 
 
-def check_ili(ss, fix):
-    errors = 0
+def check_ili(ss):
     if (not ss.ili or ss.ili == "in") and not ss.ili_definition:
-        if fix:
-            print("python3 scripts/change-definition.py --ili %s" % ss.id)
-        else:
-            print("%s does not have an ILI definition" % ss.id)
-        errors += 1
-    return errors
+        return [Finding("%s does not have an ILI definition" % ss.id, [ss.id],
+                        "python3 scripts/change-definition.py --ili %s" % ss.id)]
+    return []
 
 
-def check_lex_files(wn, fix):
+def check_lex_files(wn, lexfiles=None):
+    """Check the lexicon of each lexfile (by default, those in src/xml)"""
     pos_map = {
         "nou": PartOfSpeech.NOUN,
         "ver": PartOfSpeech.VERB,
         "adj": PartOfSpeech.ADJECTIVE,
         "adv": PartOfSpeech.ADVERB
     }
-    errors = 0
-    for f in glob.glob("src/xml/wn-*.xml"):
-        lexfile = f[11:-4]
+    if lexfiles is None:
+        lexfiles = ValidationIndex(wn).lexfiles
+    keys = sense_keys.SenseKeyCalculator(wn)
+    errors = []
+    for lexfile, swn in lexfiles.items():
         lex_pos = pos_map[lexfile[:3]]
-        swn = parse_wordnet(f)
         for synset in swn.synsets:
             if synset.lex_name != lexfile:
-                print("%s declared in %s but listed as %s" %
-                      (synset.id, lexfile, synset.lex_name))
-                errors += 1
+                errors.append(Finding("%s declared in %s but listed as %s" %
+                      (synset.id, lexfile, synset.lex_name), [synset.id]))
             if not equal_pos(lex_pos, synset.part_of_speech):
-                print("%s declared in %s but has wrong POS %s" %
-                      (synset.id, lexfile, synset.part_of_speech))
-                errors += 1
+                errors.append(Finding("%s declared in %s but has wrong POS %s" %
+                      (synset.id, lexfile, synset.part_of_speech), [synset.id]))
         for entry in swn.entries:
             if len(entry.senses) == 0:
-                print("%s is empty in %s" % (entry.id, lexfile))
-                errors += 1
+                errors.append(Finding("%s is empty in %s" % (entry.id, lexfile),
+                                      [entry.id]))
             for sense in entry.senses:
                 if not sense.id:
-                    print("%s does not have a sense key" % (sense.id))
-                    errors += 1
-                calc_sense_key = sense_keys.get_sense_key(
-                    wn, entry, sense, f)
+                    errors.append(Finding("%s does not have a sense key" %
+                                          (sense.id), [entry.id]))
+                calc_sense_key = keys.sense_key(entry, sense, lexfile)
                 sense_key = unmap_sense_key(sense.id)
                 if sense_key != calc_sense_key:
-                    if fix:
-                        print(
-                            "sed -i 's/%s/%s/' src/xml/*" %
-                            (sense_key, calc_sense_key))
-                    else:
-                        print(
-                            "%s has declared key %s but should be %s" %
-                            (sense.id, sense_key, calc_sense_key))
-                    errors += 1
+                    errors.append(Finding(
+                        "%s has declared key %s but should be %s" %
+                        (sense.id, sense_key, calc_sense_key), [sense.id],
+                        "sed -i 's/%s/%s/' src/xml/*" %
+                        (sense_key, calc_sense_key)))
 
     return errors
 
@@ -207,198 +573,448 @@ def is_valid_sense_id(xml_id, synset):
         return True
 
 
-def main():
-    wn = parse_wordnet("wn.xml")
+def duplicates(items):
+    """The items that occur more than once, each given once in the order of
+    its second occurrence"""
+    seen = set()
+    found = []
+    for item in items:
+        if item in seen:
+            if item not in found:
+                found.append(item)
+        else:
+            seen.add(item)
+    return found
 
-    if len(sys.argv) > 1 and sys.argv[1] == "--fix":
-        fix = True
-    else:
-        fix = False
 
-    errors = 0
+def duplicate_sense_keys(wn):
+    """The IDs of the senses whose sense key is already the ID of an earlier
+    sense"""
+    seen_keys = set()
+    found = set()
+    for entry in wn.entries:
+        for sense in entry.senses:
+            if unmap_sense_key(sense.id) in seen_keys:
+                found.add(sense.id)
+            else:
+                seen_keys.add(sense.id)
+    return found
 
-    errors += check_lex_files(wn, fix)
 
-    sense_keys = {}
+def check_entries(wn, fix, duplicate_keys=None):
+    """Check the entries of wn, where duplicate_keys are the IDs of the
+    senses with duplicate sense keys (by default those found in wn)"""
+    errors = []
+    if duplicate_keys is None:
+        duplicate_keys = duplicate_sense_keys(wn)
 
     for entry in wn.entries:
         if (entry.id[-1:] != entry.lemma.part_of_speech.value and not entry.id[-1].isnumeric()
             or entry.id[-1].isnumeric() and entry.id[-3:-2] != entry.lemma.part_of_speech.value):
-            print("ERROR: Entry ID not same as part of speech %s as %s" %
-                  (entry.id, entry.lemma.part_of_speech.value))
-            errors += 1
+            errors.append(Finding("ERROR: Entry ID not same as part of speech %s as %s" %
+                  (entry.id, entry.lemma.part_of_speech.value), [entry.id]))
         if not is_valid_id(entry.id):
             if fix:
-                sys.stderr.write("Cannot be fixed")
-                sys.exit(-1)
-            print("ERROR: Invalid ID " + entry.id)
-            errors += 1
+                raise CannotBeFixed(entry.id)
+            errors.append(Finding("ERROR: Invalid ID " + entry.id, [entry.id]))
         for sense in entry.senses:
             synset = wn.synset_by_id(sense.synset)
             if not synset:
-                print(
+                errors.append(Finding(
                     "ERROR: Entry %s refers to nonexistent synset %s" %
-                    (entry.id, sense.synset))
-                errors += 1
+                    (entry.id, sense.synset), [entry.id, sense.synset]))
             if (synset and entry.lemma.part_of_speech != synset.part_of_speech
                     and not (entry.lemma.part_of_speech == PartOfSpeech.ADJECTIVE and
                         synset.part_of_speech == PartOfSpeech.ADJECTIVE_SATELLITE)):
-                print(
+                errors.append(Finding(
                     "ERROR: Part of speech of entry not the same as synset %s in %s" %
-                    (entry.id, synset.id))
-                errors += 1
+                    (entry.id, synset.id), [entry.id, synset.id]))
             for sr in sense.sense_relations:
                 if sr.rel_type == SenseRelType.PERTAINYM:
                     ss_source = wn.synset_by_id(sense.synset)
                     if ((not equal_pos(ss_source.part_of_speech, PartOfSpeech.ADJECTIVE)
                          and not equal_pos(ss_source.part_of_speech, PartOfSpeech.ADVERB))):
-                        print(
+                        errors.append(Finding(
                             "ERROR: Pertainyms should be between adjectives %s => %s" %
-                            (sense.id, sr.target))
-                        errors += 1
-            sr_counter = Counter((sr.target, sr.rel_type)
-                                 for sr in sense.sense_relations)
-            for item, count in sr_counter.items():
-                if count > 1:
-                    print(
-                        "ERROR: Duplicate relation %s =%s=> %s" %
-                        (sense.id, item[1], item[0]))
-                    errors += 1
+                            (sense.id, sr.target), [sense.id, sr.target]))
+            for item in duplicates((sr.target, sr.rel_type)
+                                   for sr in sense.sense_relations):
+                errors.append(Finding(
+                    "ERROR: Duplicate relation %s =%s=> %s" %
+                    (sense.id, item[1], item[0]), [sense.id, item[0]]))
                 # if sr.target == sense.id:
                 #    print("ERROR: Reflexive sense relation %s" % (sense.id))
                 #    errors += 1
-            if unmap_sense_key(sense.id) in sense_keys:
-                print("ERROR: Duplicate sense key %s" % sense.id)
-                errors += 1
-            else:
-                sense_keys[sense.id] = sense.synset
-            sb_counter = Counter(sense.subcat)
-            for item, count in sb_counter.items():
-                if count > 1:
-                    print(
-                        "ERROR: Duplicate syntactic behaviour in entry %s" %
-                        (entry.id))
-                    errors += 1
+            if sense.id in duplicate_keys:
+                errors.append(Finding("ERROR: Duplicate sense key %s" % sense.id,
+                                      [sense.id]))
+            for item in duplicates(sense.subcat):
+                errors.append(Finding(
+                    "ERROR: Duplicate syntactic behaviour in entry %s" %
+                    (entry.id), [entry.id, sense.id]))
+    return errors
+
 
+def check_synsets(wn, fix):
+    errors = []
     for synset in wn.synsets:
         if synset.id[-1:] != synset.part_of_speech.value:
-            print(
+            errors.append(Finding(
                 "ERROR: Synset ID not same as part of speech %s as %s" %
-                (synset.id, synset.part_of_speech.value))
-            errors += 1
+                (synset.id, synset.part_of_speech.value), [synset.id]))
         if not is_valid_synset_id(synset.id):
             if fix:
-                sys.stderr.write("Cannot be fixed")
-                sys.exit(-1)
-            print("ERROR: Invalid ID " + synset.id)
-            errors += 1
+                raise CannotBeFixed(synset.id)
+            errors.append(Finding("ERROR: Invalid ID " + synset.id, [synset.id]))
         if not check_not_empty(wn, synset):
-            print("ERROR: Empty synset " + synset.id)
-            errors += 1
+            errors.append(Finding("ERROR: Empty synset " + synset.id, [synset.id]))
 
-        errors += check_ili(synset, fix)
+        errors.extend(check_ili(synset))
 
         similars = 0
         for sr in synset.synset_relations:
             if (sr.rel_type == SynsetRelType.HYPERNYM and not equal_pos(
                     synset.part_of_speech, wn.synset_by_id(sr.target).part_of_speech)):
-                print(
+                errors.append(Finding(
                     "ERROR: Cross-part-of-speech hypernym %s => %s" %
-                    (synset.id, sr.target))
-                errors += 1
+                    (synset.id, sr.target), [synset.id, sr.target]))
             if sr.rel_type == SynsetRelType.SIMILAR:
                 if (not equal_pos(synset.part_of_speech, PartOfSpeech.VERB) and
                         not equal_pos(synset.part_of_speech, PartOfSpeech.ADJECTIVE)):
-                    print(
+                    errors.append(Finding(
                         "ERROR: similar not between verb/adjective %s => %s" %
-                        (synset.id, sr.target))
-                    errors += 1
+                        (synset.id, sr.target), [synset.id, sr.target]))
                 similars += 1
                 if similars > 1 and synset.part_of_speech == PartOfSpeech.ADJECTIVE_SATELLITE:
-                    print(
+                    errors.append(Finding(
                         "ERROR: satellite of more than one synset %s" %
-                        (synset.id))
-                    errors += 1
+                        (synset.id), [synset.id]))
             if sr.rel_type == SynsetRelType.ANTONYM:
-                print(
+                errors.append(Finding(
                     "ERROR: antonymy should be at the sense level %s => %s" %
-                    (synset.id, sr.target))
-                errors += 1
+                    (synset.id, sr.target), [synset.id, sr.target]))
             # if sense.id == sr.target:
             #    print("ERROR: reflexive synset relation for %s" % (synset.id))
             #    errors += 1
 
-        # Duplicate relation check
-        sr2 = sorted(synset.synset_relations, key=lambda sr: (sr.target, sr.rel_type.value))
-        for i in range(len(sr2)-1):
-            if sr2[i].target == sr2[i+1].target and sr2[i].rel_type == sr2[i+1].rel_type:
-                print("ERROR: Duplicate synset relation %s =%s=> %s" %
-                        (synset.id, sr2[i].rel_type.value, sr2.target))
-                errors += 1
+        for item in duplicates((sr.target, sr.rel_type)
+                               for sr in synset.synset_relations):
+            errors.append(Finding(
+                "ERROR: Duplicate relation %s =%s=> %s" %
+                (synset.id, item[1], item[0]), [synset.id, item[0]]))
 
         if synset.part_of_speech == PartOfSpeech.ADJECTIVE_SATELLITE and similars == 0:
-            print(
+            errors.append(Finding(
                 "ERROR: satellite must have at least one similar link %s" %
-                (synset.id))
-            errors += 1
+                (synset.id), [synset.id]))
 
         if (synset.part_of_speech == PartOfSpeech.NOUN and not
             [sr for sr in synset.synset_relations 
                 if sr.rel_type == SynsetRelType.HYPERNYM or
                    sr.rel_type == SynsetRelType.INSTANCE_HYPERNYM] and
             synset.id != "oewn-00001740-n"):
-            print("ERROR: noun synset %s has no hypernym" % synset.id)
-            errors += 1
+            errors.append(Finding("ERROR: noun synset %s has no hypernym" % synset.id,
+                                  [synset.id]))
 
         if len(synset.definitions) == 0:
-            print("ERROR: synset without definition %s" % (synset.id))
-            errors += 1
+            errors.append(Finding("ERROR: synset without definition %s" % (synset.id),
+                                  [synset.id]))
         for defn in synset.definitions:
             if len(defn.text) == 0:
-                print("ERROR: empty definition for %s" % (synset.id))
-                errors += 1
-
-        sr_counter = Counter((sr.target, sr.rel_type)
-                             for sr in synset.synset_relations)
-        for item, count in sr_counter.items():
-            if count > 1:
-                print(
-                    "ERROR: Duplicate relation %s =%s=> %s" %
-                    (synset.id, item[1], item[0]))
-                errors += 1
+                errors.append(Finding("ERROR: empty definition for %s" % (synset.id),
+                                      [synset.id]))
+    return errors
 
-    for error in check_symmetry(wn, fix):
-        if fix:
-            print(error)
-        else:
-            print("ERROR: " + error)
-            errors += 1
 
-    for error in check_transitive(wn, fix):
-        if fix:
-            print(error)
-        else:
-            print("ERROR: " + error)
-            errors += 1
+class CannotBeFixed(Exception):
+    """Raised by a rule when --fix is given but an error cannot be fixed"""
+    pass
 
-    for error in check_no_loops(wn):
-        if fix:
-            sys.stderr.write("Cannot be fixed")
-            sys.exit(-1)
-        else:
-            print("ERROR: " + error)
-            errors += 1
 
-    for error in check_no_domain_loops(wn):
-        if fix:
-            sys.stderr.write("Cannot be fixed")
-            sys.exit(-1)
+class Finding:
+    """An issue found by a validation rule. The text is the line printed for
+    it, subjects are the IDs of the synsets, entries and senses it is about
+    and fix is a command that fixes it (if there is one). Warnings are
+    printed but are not counted as errors"""
+
+    def __init__(self, text, subjects, fix=None, severity="error"):
+        self.text = text
+        self.subjects = subjects
+        self.fix = fix
+        self.severity = severity
+
+    @property
+    def message(self):
+        if self.text.startswith("ERROR: "):
+            return self.text[7:]
+        return self.text
+
+    def line(self, fix):
+        """The line to print, which is the fix if fixing"""
+        if fix and self.fix:
+            return self.fix
+        return self.text
+
+    def to_json(self, rule_name):
+        return json.dumps({"rule": rule_name, "severity": self.severity,
+                           "message": self.message,
+                           "subjects": self.subjects, "fix": self.fix})
+
+
+class Rule:
+    """A validation rule. The check is called with the ValidationIndex and
+    whether to print fixes and returns a list of Findings. Rules that are
+    not default are only run when selected. Local rules only look at the
+    relations of each synset and sense and so can be run on the
+    neighbourhood of a change"""
+
+    def __init__(self, name, check, description, needs=(), default=True,
+                 local=True):
+        self.name = name
+        self.check = check
+        self.description = description
+        self.needs = needs
+        self.default = default
+        self.local = local
+
+
+rules = {}
+
+
+def rule(name, description, needs=(), default=True, local=True):
+    """Register a function as a validation rule"""
+    def register(check):
+        rules[name] = Rule(name, check, description, needs, default, local)
+        return check
+    return register
+
+
+def no_fix(errors, fix):
+    if fix and errors:
+        raise CannotBeFixed(errors[0].text)
+    return errors
+
+
+@rule("lex-files", "Lexfile membership, part of speech and sense keys",
+      needs=("lexfiles",), local=False)
+def lex_files_rule(index, fix):
+    return check_lex_files(index.wn, index.lexfiles)
+
+
+@rule("entries", "IDs, parts of speech and duplicates of entries and senses",
+      needs=("duplicate_sense_keys",))
+def entries_rule(index, fix):
+    return check_entries(index.wn, fix, index.duplicate_sense_keys)
+
+
+@rule("synsets", "IDs, definitions, ILI and relations of synsets")
+def synsets_rule(index, fix):
+    return check_synsets(index.wn, fix)
+
+
+@rule("symmetry", "Inverse relations are present",
+      needs=("synset_triples", "sense_triples"))
+def symmetry_rule(index, fix):
+    return check_symmetry(index.wn, index)
+
+
+@rule("transitive", "No hypernym is also a hypernym of another hypernym",
+      needs=("hypernyms",))
+def transitive_rule(index, fix):
+    return check_transitive(index.wn, index)
+
+
+@rule("deep-transitive", "No hypernym is an ancestor of another hypernym",
+      needs=("hypernyms",), default=False, local=False)
+def deep_transitive_rule(index, fix):
+    return check_redundant_hypernyms(index.wn, index)
+
+
+@rule("loops", "No loops in the hypernym hierarchy", needs=("hypernyms",))
+def loops_rule(index, fix):
+    return no_fix(check_no_loops(index.wn, index), fix)
+
+
+@rule("domain-loops", "No loops in the domain relations")
+def domain_loops_rule(index, fix):
+    return no_fix(check_no_domain_loops(index.wn, index), fix)
+
+
+# The index and fix flag used by the rules run in worker processes, which
+# are inherited by fork rather than copied to each worker
+worker_state = None
+
+
+def run_rule(name, index, fix):
+    start = time.perf_counter()
+    findings = rules[name].check(index, fix)
+    return findings, time.perf_counter() - start
+
+
+def run_rule_in_worker(name):
+    index, fix = worker_state
+    try:
+        return run_rule(name, index, fix)
+    except CannotBeFixed as e:
+        return e, 0
+
+
+def print_lines(name, findings, fix):
+    for finding in findings:
+        print(finding.line(fix))
+
+
+def print_jsonl(name, findings, fix):
+    for finding in findings:
+        print(finding.to_json(name))
+    sys.stdout.flush()
+
+
+def run_rules(index, names, fix, jobs=1, output=print_lines):
+    """Run the named rules, passing the findings of each rule to output as
+    soon as it is done, in the order given. Returns the time taken and the
+    number of errors found by each rule"""
+    # Build the shared parts of the index once, before any worker starts
+    for name in names:
+        for attr in rules[name].needs:
+            getattr(index, attr)
+    if jobs > 1:
+        global worker_state
+        worker_state = (index, fix)
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+        results = pool.imap(run_rule_in_worker, names)
+    else:
+        results = (run_rule(name, index, fix) for name in names)
+    report = []
+    try:
+        for name, (findings, seconds) in zip(names, results):
+            if isinstance(findings, CannotBeFixed):
+                raise findings
+            output(name, findings, fix)
+            report.append((name, seconds, sum(
+                1 for finding in findings if finding.severity == "error")))
+    finally:
+        if jobs > 1:
+            pool.terminate()
+    return report
+
+
+def validate_changes(wn, change_list, names=None, fix=False, hops=1,
+                     output=print_lines):
+    """Run the local rules on the neighbourhood of the entries and synsets
+    in a ChangeList, printing the output. The other rules need the whole
+    wordnet and are skipped with a warning. Returns the report of run_rules"""
+    names = names or [r.name for r in rules.values() if r.default]
+    skipped = [name for name in names if not rules[name].local]
+    if skipped:
+        sys.stderr.write("Skipping the rules that are not local: %s\n"
+                         % " ".join(skipped))
+    names = [name for name in names if rules[name].local]
+    index = LocalValidationIndex(Neighbourhood(wn, change_list, hops))
+    return run_rules(index, names, fix, output=output)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate the wordnet (by default wn.xml and src/xml)")
+    parser.add_argument('--fix', action='store_true',
+                        help="Print commands to fix the errors instead of the errors")
+    parser.add_argument('--rules', nargs="+", choices=list(rules),
+                        help="The rules to run (default: all default rules)")
+    parser.add_argument('--deep-transitive', action='store_true',
+                        help="Also run the deep-transitive rule")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="The number of rules to run in parallel")
+    parser.add_argument('--list-rules', action='store_true',
+                        help="List the rules and exit")
+    parser.add_argument('--source', choices=["xml", "yaml", "snapshot"],
+                        help="Validate wn.xml and src/xml (the default), the "
+                        "YAML in src/yaml, or the latest of these and "
+                        "wn.pickle")
+    parser.add_argument('--changed-since', metavar="REV",
+                        help="Only check the entries and synsets changed in "
+                        "src/yaml since this git revision and their neighbours")
+    parser.add_argument('--hops', type=int, default=1,
+                        help="The size of the neighbourhood of the changes "
+                        "checked with --changed-since")
+    parser.add_argument('--format', choices=["text", "jsonl"], default="text",
+                        help="Print lines of text or one JSON object per "
+                        "finding followed by a summary")
+    args = parser.parse_args()
+
+    if args.list_rules:
+        for r in rules.values():
+            print("%-16s %s%s%s" % (r.name, r.description,
+                                    "" if r.default else " (not default)",
+                                    "" if r.local else " (not local)"))
+        return
+
+    if args.rules:
+        names = args.rules
+    else:
+        names = [r.name for r in rules.values() if r.default]
+    if args.deep_transitive and "deep-transitive" not in names:
+        names.append("deep-transitive")
+
+    if args.changed_since:
+        # The changes are always read from the YAML, and only the local
+        # rules can be run on part of the wordnet
+        if args.source or args.jobs != 1:
+            parser.error("--source and --jobs cannot be used with "
+                         "--changed-since")
+        not_local = [name for name in names if not rules[name].local]
+        if args.rules and not_local or args.deep_transitive:
+            parser.error("--changed-since only runs local rules, not %s"
+                         % " ".join(not_local))
+    source = args.source or "xml"
+
+    fix = args.fix
+    if args.format == "jsonl":
+        output = print_jsonl
+        # Keep the progress messages of loading out of the JSON
+        quiet = contextlib.redirect_stdout(sys.stderr)
+    else:
+        output = print_lines
+        quiet = contextlib.nullcontext()
+
+    try:
+        if args.changed_since:
+            with quiet:
+                wn = change_manager.load_wordnet()
+                change_list = change_manager.changes_since(
+                    wn, args.changed_since)
+            report = validate_changes(wn, change_list, names, fix, args.hops,
+                                      output)
+        elif source == "xml":
+            wn = parse_wordnet("wn.xml")
+            report = run_rules(ValidationIndex(wn), names, fix, args.jobs,
+                               output)
         else:
-            print("ERROR: " + error)
-            errors += 1
+            with quiet:
+                if source == "yaml":
+                    wn = wordnet_yaml.load()
+                else:
+                    wn = change_manager.load_wordnet()
+            report = run_rules(ValidationIndex(wn, lexfiles_from_xml=False),
+                               names, fix, args.jobs, output)
+    except CannotBeFixed:
+        sys.stderr.write("Cannot be fixed")
+        sys.exit(-1)
+
+    errors = 0
+    for name, seconds, count in report:
+        sys.stderr.write("%-16s %8.3fs %6d %s\n" %
+                         (name, seconds, count, "fixes" if fix else "errors"))
+        errors += count
 
- 
-    if fix:
+    if args.format == "jsonl":
+        print(json.dumps({"summary": {
+            "errors": errors,
+            "rules": [{"rule": name, "seconds": round(seconds, 3),
+                       "count": count} for name, seconds, count in report]}}))
+        if errors > 0 and not fix:
+            sys.exit(-1)
+    elif fix:
         pass
     elif errors > 0:
         print("Validation failed. %d errors" % errors)
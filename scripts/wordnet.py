@@ -1,7 +1,10 @@
 from enum import Enum
-from xml.sax import ContentHandler, parse
-import re
+from collections import OrderedDict
+from xml.sax import ContentHandler, make_parser
+from xml.sax.handler import LexicalHandler, property_lexical_handler
+from xml.parsers import expat
 import sys
+import os
 import codecs
 
 
@@ -26,6 +29,18 @@ class Lexicon:
         self.member2entry = {}
         self.members = {}
         self.sense2synset = {}
+        self.synset2senses = {}
+        self.sense2entry = {}
+
+    def __setstate__(self, state):
+        # Lexicons pickled before the senses of each synset were indexed
+        self.__dict__.update(state)
+        if "synset2senses" not in state:
+            self.synset2senses = {}
+            self.sense2entry = {}
+            for entry in self.entries:
+                for sense in entry.senses:
+                    self._index_sense(entry, sense)
 
     def __str__(self):
         return "Lexicon with ID %s and %d entries and %d synsets" % (
@@ -41,11 +56,37 @@ class Lexicon:
             self.members[sense.synset].append(entry.lemma.written_form)
             self.sense2synset[sense.id] = sense.synset
             self.id2sense[sense.id] = sense
+            self._index_sense(entry, sense)
         if entry.lemma.written_form not in self.member2entry:
             self.member2entry[entry.lemma.written_form] = []
         self.member2entry[entry.lemma.written_form].append(entry.id)
         self.entries.append(entry)
 
+    def _index_sense(self, entry, sense):
+        if sense.synset not in self.synset2senses:
+            self.synset2senses[sense.synset] = []
+        self.synset2senses[sense.synset].append(sense)
+        self.sense2entry[sense.id] = entry.id
+
+    def _unindex_sense(self, sense_id, synset_id):
+        self.synset2senses[synset_id] = [
+            s for s in self.synset2senses.get(synset_id, [])
+            if s.id != sense_id]
+        if self.synset2senses[synset_id] == []:
+            del self.synset2senses[synset_id]
+
+    def add_sense(self, entry, sense):
+        """Add a sense to an entry that is already in the lexicon, unless
+        the entry has a sense with the same ID"""
+        if not entry.add_sense(sense):
+            return
+        if sense.synset not in self.members:
+            self.members[sense.synset] = []
+        self.members[sense.synset].append(entry.lemma.written_form)
+        self.sense2synset[sense.id] = sense.synset
+        self.id2sense[sense.id] = sense
+        self._index_sense(entry, sense)
+
     def del_entry(self, entry):
         """Delete an entry and clear all senses"""
         if entry.id not in self.id2entry:
@@ -68,6 +109,8 @@ class Lexicon:
                 if m != entry.lemma.written_form]
         if self.members[sense.synset] == []:
             del self.members[sense.synset]
+        self._unindex_sense(sense.id, self.sense2synset[sense.id])
+        del self.sense2entry[sense.id]
         del self.sense2synset[sense.id]
         del self.id2sense[sense.id]
         entry.senses = [s for s in entry.senses if s.id != sense.id]
@@ -91,17 +134,43 @@ class Lexicon:
     def members_by_id(self, synset_id):
         return self.members.get(synset_id, [])
 
+    def senses_by_synset(self, synset_id):
+        """The senses of a synset, in the order they were added"""
+        return self.synset2senses.get(synset_id, [])
+
+    def entry_by_sense(self, sense_id):
+        return self.id2entry.get(self.sense2entry.get(sense_id))
+
     def sense_to_synset(self, sense_id):
         return self.sense2synset[sense_id]
 
     def change_sense_id(self, sense, new_id):
-        del self.sense2synset[sense.id]
+        """Change the ID of a sense, and move it to the synset it now has
+        if that was changed"""
+        old_synset = self.sense2synset.pop(sense.id)
+        if old_synset != sense.synset:
+            self._unindex_sense(sense.id, old_synset)
+            if sense.synset not in self.synset2senses:
+                self.synset2senses[sense.synset] = []
+            self.synset2senses[sense.synset].append(sense)
         del self.id2sense[sense.id]
+        self.sense2entry[new_id] = self.sense2entry.pop(sense.id)
         sense.id = new_id
         self.sense2synset[new_id] = sense.synset
         self.id2sense[new_id] = sense
 
     def to_xml(self, xml_file, part=True):
+        self.xml_header(xml_file, part)
+        for entry in self.entries:
+            entry.to_xml(xml_file, self.comments)
+        for synset in self.synsets:
+            synset.to_xml(xml_file, self.comments)
+        for synbeh in self.frames:
+            synbeh.to_xml(xml_file)
+        self.xml_footer(xml_file)
+
+    def xml_header(self, xml_file, part=True):
+        """Write the XML up to the opening Lexicon tag"""
         xml_file.write("""<?xml version="1.0" encoding="UTF-8"?>\n""")
         if part:
             xml_file.write(
@@ -127,12 +196,8 @@ class Lexicon:
              self.version,
              self.url))
 
-        for entry in self.entries:
-            entry.to_xml(xml_file, self.comments)
-        for synset in self.synsets:
-            synset.to_xml(xml_file, self.comments)
-        for synbeh in self.frames:
-            synbeh.to_xml(xml_file)
+    def xml_footer(self, xml_file):
+        """Write the XML after the content of the Lexicon"""
         xml_file.write("""  </Lexicon>
 </LexicalResource>\n""")
 
@@ -154,8 +219,12 @@ class LexicalEntry:
         self.forms.append(form)
 
     def add_sense(self, sense):
-        if not any(s.id == sense.id for s in self.senses):
-            self.senses.append(sense)
+        """Add a sense unless the entry has a sense with the same ID.
+        Returns whether it was added"""
+        if any(s.id == sense.id for s in self.senses):
+            return False
+        self.senses.append(sense)
+        return True
 
     def to_xml(self, xml_file, comments):
         xml_file.write("""    <LexicalEntry id="%s">""" % self.id)
@@ -608,7 +677,40 @@ inverse_sense_rels = {
 }
 
 
-class WordNetContentHandler(ContentHandler):
+class CommentCollector:
+    """Collects the comments of a WN-LMF file while it is being parsed. A
+    comment on the same line as a relation describes the relation's target,
+    any other comment describes the next synset"""
+
+    def __init__(self):
+        self.comments = {}
+        self.pending = None
+        self.rel_target = None
+        self.rel_line = -1
+
+    def start_element(self, name, attrs, line):
+        if name == "SenseRelation" or name == "SynsetRelation":
+            self.rel_target = attrs["target"]
+            self.rel_line = line
+        else:
+            self.rel_target = None
+            if name == "Synset" and self.pending:
+                self.comments[attrs["id"]] = self.pending
+                self.pending = None
+
+    def comment(self, content, line):
+        # Only single line comments in the form written by to_xml
+        if ("\n" in content or len(content) < 2 or
+                content[0] != " " or content[-1] != " "):
+            return
+        if self.rel_target is not None and line == self.rel_line:
+            self.comments[self.rel_target] = content[1:-1]
+            self.rel_target = None
+        else:
+            self.pending = content[1:-1]
+
+
+class WordNetContentHandler(ContentHandler, LexicalHandler):
     def __init__(self):
         ContentHandler.__init__(self)
         self.lexicon = None
@@ -621,8 +723,13 @@ class WordNetContentHandler(ContentHandler):
         self.synset = None
         self.pron = None
         self.pron_var = None
+        self.comments = CommentCollector()
+
+    def comment(self, content):
+        self.comments.comment(content, self._locator.getLineNumber())
 
     def startElement(self, name, attrs):
+        self.comments.start_element(name, attrs, self._locator.getLineNumber())
         if name == "Lexicon":
             self.lexicon = Lexicon(
                 attrs["id"],
@@ -684,6 +791,9 @@ class WordNetContentHandler(ContentHandler):
         else:
             raise ValueError("Unexpected Tag: " + name)
 
+    def endDocument(self):
+        self.lexicon.comments = self.comments.comments
+
     def endElement(self, name):
         if name == "LexicalEntry":
             self.lexicon.add_entry(self.entry)
@@ -719,8 +829,169 @@ class WordNetContentHandler(ContentHandler):
         elif content.strip() == '':
             pass
         else:
-            print(content)
-            raise ValueError("Text content not expected")
+            raise ValueError("Text content not expected: %r" % content)
+
+
+class WordNetExpatHandler:
+    """Builds a Lexicon directly from pyexpat callbacks. This produces the
+    same result as the WordNetContentHandler but dispatches on the tag name
+    through a table and collects text in a list that is joined once"""
+
+    def __init__(self):
+        self.lexicon = None
+        self.entry = None
+        self.sense = None
+        self.synset = None
+        self.text = None
+        self.example_source = None
+        self.pron_var = None
+        self.parser = None
+        self.comments = CommentCollector()
+        self.start_handlers = {
+            "Lexicon": self.start_lexicon,
+            "LexicalEntry": self.start_entry,
+            "Lemma": self.start_lemma,
+            "Form": self.start_form,
+            "Sense": self.start_sense,
+            "Synset": self.start_synset,
+            "Definition": self.start_text,
+            "ILIDefinition": self.start_text,
+            "Example": self.start_example,
+            "SynsetRelation": self.start_synset_relation,
+            "SenseRelation": self.start_sense_relation,
+            "SyntacticBehaviour": self.ignore,
+            "Pronunciation": self.start_pronunciation,
+            "LexicalResource": self.ignore
+        }
+        self.end_handlers = {
+            "LexicalEntry": self.end_entry,
+            "Sense": self.end_sense,
+            "Synset": self.end_synset,
+            "Definition": self.end_definition,
+            "ILIDefinition": self.end_ili_definition,
+            "Example": self.end_example,
+            "Pronunciation": self.end_pronunciation
+        }
+
+    def start_element(self, name, attrs):
+        self.comments.start_element(name, attrs,
+                                    self.parser.CurrentLineNumber)
+        handler = self.start_handlers.get(name)
+        if handler is None:
+            raise ValueError("Unexpected Tag: " + name)
+        handler(attrs)
+
+    def end_element(self, name):
+        handler = self.end_handlers.get(name)
+        if handler is not None:
+            handler()
+
+    def comment(self, content):
+        self.comments.comment(content, self.parser.CurrentLineNumber)
+
+    def characters(self, content):
+        if self.text is not None:
+            self.text.append(content)
+        elif content.strip() != '':
+            raise ValueError("Text content not expected: %r" % content)
+
+    def take_text(self):
+        text = "".join(self.text)
+        self.text = None
+        return text
+
+    def ignore(self, attrs):
+        pass
+
+    def start_lexicon(self, attrs):
+        self.lexicon = Lexicon(
+            attrs["id"],
+            attrs["label"],
+            attrs["language"],
+            attrs["email"],
+            attrs["license"],
+            attrs["version"],
+            attrs["url"])
+
+    def start_entry(self, attrs):
+        self.entry = LexicalEntry(attrs["id"])
+
+    def start_lemma(self, attrs):
+        self.entry.set_lemma(
+            Lemma(attrs["writtenForm"], PartOfSpeech(attrs["partOfSpeech"])))
+
+    def start_form(self, attrs):
+        self.entry.add_form(Form(attrs["writtenForm"]))
+
+    def start_sense(self, attrs):
+        if "n" in attrs:
+            n = int(attrs["n"])
+        else:
+            n = -1
+        self.sense = Sense(attrs["id"], attrs["synset"], attrs.get(
+            "dc:identifier") or "", n, attrs.get("adjposition"))
+
+    def start_synset(self, attrs):
+        self.synset = Synset(attrs["id"], attrs["ili"],
+                             PartOfSpeech(attrs["partOfSpeech"]),
+                             attrs.get("lexfile", attrs.get("dc:subject", "")),
+                             attrs.get("dc:source", ""))
+        self.synset.members = attrs.get("members", "").split(" ")
+
+    def start_text(self, attrs):
+        self.text = []
+
+    def start_example(self, attrs):
+        self.text = []
+        self.example_source = attrs.get("dc:source")
+
+    def start_synset_relation(self, attrs):
+        self.synset.add_synset_relation(
+            SynsetRelation(attrs["target"], SynsetRelType(attrs["relType"])))
+
+    def start_sense_relation(self, attrs):
+        self.sense.add_sense_relation(
+            SenseRelation(attrs["target"], SenseRelType(attrs["relType"])))
+
+    def start_pronunciation(self, attrs):
+        self.text = []
+        self.pron_var = attrs.get("variety")
+
+    def end_entry(self):
+        self.lexicon.add_entry(self.entry)
+        self.entry = None
+
+    def end_sense(self):
+        self.entry.add_sense(self.sense)
+        self.sense = None
+
+    def end_synset(self):
+        self.lexicon.add_synset(self.synset)
+        self.synset = None
+
+    def end_definition(self):
+        self.synset.add_definition(Definition(self.take_text()))
+
+    def end_ili_definition(self):
+        self.synset.add_definition(Definition(self.take_text()), True)
+
+    def end_example(self):
+        self.synset.add_example(Example(self.take_text(), self.example_source))
+
+    def end_pronunciation(self):
+        self.entry.pronunciation.append(
+            Pronunciation(self.take_text(), self.pron_var))
+
+    def parse(self, source):
+        self.parser = parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = 65536
+        parser.StartElementHandler = self.start_element
+        parser.EndElementHandler = self.end_element
+        parser.CharacterDataHandler = self.characters
+        parser.CommentHandler = self.comment
+        parser.ParseFile(source)
+        self.lexicon.comments = self.comments.comments
 
 
 def escape_xml_lit(lit):
@@ -728,34 +999,6 @@ def escape_xml_lit(lit):
             replace("\"", "&quot;").replace("<", "&lt;").replace(">", "&gt;"))
 
 
-def extract_comments(wordnet_file, lexicon):
-    with codecs.open(wordnet_file, "r", encoding="utf-8") as source:
-        sen_rel_comment = re.compile(
-            ".*<SenseRelation .* target=\"(.*)\".*/> <!-- (.*) -->")
-        syn_rel_comment = re.compile(
-            ".*<SynsetRelation .* target=\"(.*)\".*/> <!-- (.*) -->")
-        comment = re.compile(".*<!-- (.*) -->.*")
-        synset = re.compile(".*<Synset id=\"(\\S*)\".*")
-        c = None
-        for line in source.readlines():
-            m = sen_rel_comment.match(line)
-            if m:
-                lexicon.comments[m.group(1)] = m.group(2)
-            else:
-                m = syn_rel_comment.match(line)
-                if m:
-                    lexicon.comments[m.group(1)] = m.group(2)
-                else:
-                    m = comment.match(line)
-                    if m:
-                        c = m.group(1)
-                    else:
-                        m = synset.match(line)
-                        if m and c:
-                            lexicon.comments[m.group(1)] = c
-                            c = None
-
-
 def escape_lemma(lemma):
     """Format the lemma so it is valid XML id"""
     def elc(c):
@@ -786,14 +1029,82 @@ def escape_lemma(lemma):
     return "".join(elc(c) for c in lemma)
 
 
-def parse_wordnet(wordnet_file):
+def parse_wordnet_sax(wordnet_file):
     with codecs.open(wordnet_file, "r", encoding="utf-8") as source:
         handler = WordNetContentHandler()
-        parse(source, handler)
-    extract_comments(wordnet_file, handler.lexicon)
+        reader = make_parser()
+        reader.setContentHandler(handler)
+        reader.setProperty(property_lexical_handler, handler)
+        reader.parse(source)
+    return handler.lexicon
+
+
+def parse_wordnet_expat(wordnet_file):
+    with open(wordnet_file, "rb") as source:
+        handler = WordNetExpatHandler()
+        handler.parse(source)
     return handler.lexicon
 
 
+parsers = {
+    "expat": parse_wordnet_expat,
+    "sax": parse_wordnet_sax
+}
+
+# The parser used when none is given, may be overridden with the
+# WN_XML_PARSER environment variable
+default_parser = os.environ.get("WN_XML_PARSER", "expat")
+
+
+def parse_wordnet(wordnet_file, parser=None):
+    """Parse a WN-LMF XML file into a Lexicon. The parser may be one of
+    the keys of `parsers`, all of which give identical results"""
+    return parsers[parser or default_parser](wordnet_file)
+
+
+class LexiconCache:
+    """A least-recently-used cache of parsed XML files. An entry is only
+    reused while the size and modification time of the file are unchanged.
+    The default size keeps a few lexfiles, not all of them, as each is
+    kept in memory until it is evicted"""
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.lexicons = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, wordnet_file):
+        path = os.path.abspath(wordnet_file)
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+        cached = self.lexicons.get(path)
+        if cached and cached[0] == version:
+            self.lexicons.move_to_end(path)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        lexicon = parse_wordnet(wordnet_file)
+        self.lexicons[path] = (version, lexicon)
+        self.lexicons.move_to_end(path)
+        while len(self.lexicons) > self.maxsize:
+            self.lexicons.popitem(last=False)
+        return lexicon
+
+    def clear(self):
+        self.lexicons.clear()
+
+
+lexicon_cache = LexiconCache()
+
+
+def parse_wordnet_cached(wordnet_file):
+    """Parse a WN-LMF XML file, reusing the result of an earlier parse of the
+    same unchanged file. The lexicon returned is shared between callers and
+    must not be modified"""
+    return lexicon_cache.get(wordnet_file)
+
+
 if __name__ == "__main__":
     wordnet = parse_wordnet(sys.argv[1])
     xml_file = open("wn31-test.xml", "w")
@@ -0,0 +1,607 @@
+"""Queries over a lexicon, answered from indexes built once when the
+lexicon is loaded, e.g.,
+
+    wn = parse_wordnet("wn.xml")
+    hypernyms = HypernymIndex(wn)
+    hypernyms.is_a("oewn-02086723-n", "oewn-00015388-n")
+"""
+from wordnet import *
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import gc
+import pickle
+
+hypernym_rel_types = {SynsetRelType.HYPERNYM, SynsetRelType.INSTANCE_HYPERNYM}
+
+
+class HypernymIndex:
+    """The hypernym hierarchy (hypernyms and instance hypernyms, and the
+    inverses of hyponyms and instance hyponyms) of a lexicon with, for each
+    synset, its depth and ancestors precomputed.
+
+    Synsets are numbered in the postorder of a depth-first search down from
+    the roots, so the descendants of a synset along the spanning tree of the
+    search are a range of numbers. The descendants reached through its other
+    hyponyms add further ranges, and is_a looks up the number of one synset
+    in the merged ranges of the other. Loops are ignored, as the search does
+    not follow an edge back to a synset it is still visiting"""
+
+    def __init__(self, wn):
+        self.ids = [synset.id for synset in wn.synsets]
+        self.number = {synset_id: i for i, synset_id in enumerate(self.ids)}
+        # A hyponym link counts even if its inverse hypernym link is missing
+        parents = [{} for _ in self.ids]
+        for node, synset in enumerate(wn.synsets):
+            for rel in synset.synset_relations:
+                if rel.target not in self.number:
+                    continue
+                if rel.rel_type in hypernym_rel_types:
+                    parents[node][self.number[rel.target]] = True
+                elif inverse_synset_rels.get(rel.rel_type) in hypernym_rel_types:
+                    parents[self.number[rel.target]][node] = True
+        self.parents = [tuple(p) for p in parents]
+        self.children = [[] for _ in self.ids]
+        for node, parents in enumerate(self.parents):
+            for parent in parents:
+                self.children[parent].append(node)
+        self.roots = [node for node, parents in enumerate(self.parents)
+                      if not parents]
+
+        order = self._postorder()
+        self._label(order)
+        self._depths(order)
+        self._ancestors(order)
+        self.paths = {}
+
+    def _postorder(self):
+        # An iterative DFS down from the roots, and then from any synset
+        # that is only reachable through a loop
+        post = [None] * len(self.ids)
+        low = [None] * len(self.ids)
+        visited = [False] * len(self.ids)
+        order = []
+        for root in self.roots + list(range(len(self.ids))):
+            if visited[root]:
+                continue
+            visited[root] = True
+            stack = [(root, iter(self.children[root]), len(order))]
+            while stack:
+                node, children, first = stack[-1]
+                for child in children:
+                    if not visited[child]:
+                        visited[child] = True
+                        stack.append((child, iter(self.children[child]),
+                                      len(order)))
+                        break
+                else:
+                    stack.pop()
+                    low[node] = first
+                    post[node] = len(order)
+                    order.append(node)
+        self.post = post
+        self.low = low
+        return order
+
+    def _label(self, order):
+        # The ranges of the descendants of each synset, built from those of
+        # its children (which come first in the postorder)
+        self.starts = [None] * len(self.ids)
+        self.ends = [None] * len(self.ids)
+        for node in order:
+            ranges = [(self.low[node], self.post[node])]
+            for child in self.children[node]:
+                if self.starts[child] is None:
+                    # A loop back to a synset still being visited
+                    continue
+                ranges.extend(zip(self.starts[child], self.ends[child]))
+            ranges.sort()
+            starts = []
+            ends = []
+            for start, end in ranges:
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.starts[node] = tuple(starts)
+            self.ends[node] = tuple(ends)
+
+    def _depths(self, order):
+        # The shortest and longest paths from a root, in topological order
+        self.min_depths = [None] * len(self.ids)
+        self.max_depths = [0] * len(self.ids)
+        for node in reversed(order):
+            parents = [p for p in self.parents[node]
+                       if self.min_depths[p] is not None]
+            if parents:
+                self.min_depths[node] = 1 + min(
+                    self.min_depths[p] for p in parents)
+                self.max_depths[node] = 1 + max(
+                    self.max_depths[p] for p in parents)
+            else:
+                self.min_depths[node] = 0
+
+    def _ancestors(self, order):
+        self.ancestor_numbers = [None] * len(self.ids)
+        for node in reversed(order):
+            ancestors = set()
+            for parent in self.parents[node]:
+                if self.ancestor_numbers[parent] is not None:
+                    ancestors.add(parent)
+                    ancestors.update(self.ancestor_numbers[parent])
+            self.ancestor_numbers[node] = tuple(sorted(ancestors))
+
+    def _is_a(self, node, ancestor):
+        p = self.post[node]
+        i = bisect_right(self.starts[ancestor], p) - 1
+        return i >= 0 and p <= self.ends[ancestor][i]
+
+    def is_a(self, synset_id, ancestor_id):
+        """Whether a synset is a kind (or an instance) of another, that is,
+        the other synset is the same synset or one of its ancestors"""
+        return self._is_a(self.number[synset_id], self.number[ancestor_id])
+
+    def ancestors(self, synset_id):
+        """The IDs of all ancestors of a synset"""
+        return [self.ids[a] for a in
+                self.ancestor_numbers[self.number[synset_id]]]
+
+    def _descendant_count(self, node):
+        return sum(end - start + 1 for start, end in
+                   zip(self.starts[node], self.ends[node])) - 1
+
+    def descendant_count(self, synset_id):
+        """The number of hyponyms of a synset, direct or not"""
+        return self._descendant_count(self.number[synset_id])
+
+    def depth(self, synset_id):
+        """The length of the shortest path from a root to the synset"""
+        return self.min_depths[self.number[synset_id]]
+
+    def max_depth(self, synset_id):
+        """The length of the longest path from a root to the synset"""
+        return self.max_depths[self.number[synset_id]]
+
+    def root_paths(self, synset_id):
+        """All paths from a root to the synset, as lists of IDs. These are
+        computed when first asked for and then kept"""
+        return [[self.ids[n] for n in path]
+                for path in self._root_paths(self.number[synset_id])]
+
+    def _root_paths(self, node):
+        if node not in self.paths:
+            # Compute the paths of the ancestors first, in order of depth,
+            # so the paths of the parents of each synset are already known
+            for ancestor in sorted(self.ancestor_numbers[node],
+                                   key=lambda a: self.max_depths[a]):
+                if ancestor not in self.paths:
+                    self.paths[ancestor] = self._paths_from_parents(ancestor)
+            self.paths[node] = self._paths_from_parents(node)
+        return self.paths[node]
+
+    def _paths_from_parents(self, node):
+        paths = [path + (node,) for parent in self.parents[node]
+                 if parent in self.paths for path in self.paths[parent]]
+        return paths or [(node,)]
+
+
+class RelationGraph:
+    """The synset and sense relations of a lexicon as integer adjacency
+    arrays between synsets, for expanding many synsets at once. A sense
+    relation links the synset of its source sense to that of its target.
+
+    The relations from synset n are the entries offsets[n] up to
+    offsets[n + 1] of the targets and types arrays, where each type is the
+    number of a bit in the masks of relation types"""
+
+    rel_types = list(SynsetRelType) + list(SenseRelType)
+
+    def __init__(self, wn):
+        self.ids = [synset.id for synset in wn.synsets]
+        self.number = {synset_id: i for i, synset_id in enumerate(self.ids)}
+        self.sense_number = {}
+        for entry in wn.entries:
+            for sense in entry.senses:
+                if sense.synset in self.number:
+                    self.sense_number[sense.id] = self.number[sense.synset]
+        bits = {rel_type: bit for bit, rel_type in enumerate(self.rel_types)}
+        edges = [[] for _ in self.ids]
+        for node, synset in enumerate(wn.synsets):
+            for rel in synset.synset_relations:
+                if rel.target in self.number:
+                    edges[node].append((self.number[rel.target],
+                                        bits[rel.rel_type]))
+        for entry in wn.entries:
+            for sense in entry.senses:
+                source = self.sense_number.get(sense.id)
+                for rel in sense.sense_relations:
+                    if source is not None and rel.target in self.sense_number:
+                        edges[source].append((self.sense_number[rel.target],
+                                              bits[rel.rel_type]))
+        self.offsets = array("I", [0])
+        self.targets = array("I")
+        self.types = array("B")
+        for node_edges in edges:
+            for target, bit in node_edges:
+                self.targets.append(target)
+                self.types.append(bit)
+            self.offsets.append(len(self.targets))
+        self.adjacency = {}
+
+    def mask(self, rel_types):
+        """The mask of a collection of SynsetRelTypes and SenseRelTypes"""
+        mask = 0
+        for rel_type in rel_types:
+            mask |= 1 << self.rel_types.index(rel_type)
+        return mask
+
+    def _adjacency(self, mask):
+        # The offsets and targets of only the relations in a mask, built
+        # the first time the mask is used
+        if mask not in self.adjacency:
+            offsets = array("I", [0])
+            targets = array("I")
+            for node in range(len(self.ids)):
+                for edge in range(self.offsets[node], self.offsets[node + 1]):
+                    if mask >> self.types[edge] & 1:
+                        targets.append(self.targets[edge])
+                offsets.append(len(targets))
+            self.adjacency[mask] = (offsets, targets)
+        return self.adjacency[mask]
+
+    def node(self, synset_or_sense_id):
+        """The number of a synset, or of the synset of a sense"""
+        if synset_or_sense_id in self.number:
+            return self.number[synset_or_sense_id]
+        return self.sense_number[synset_or_sense_id]
+
+    def expand(self, seeds, rel_types, hops=1):
+        """Every synset within a number of hops of the seeds (synset or
+        sense IDs) following relations of the given types (or a mask of
+        them), by a breadth-first search from all the seeds at once.
+
+        Returns three arrays: the number of each synset found (each only
+        once, the seeds first), its distance from the nearest seed and the
+        index in seeds of that seed. The IDs are ids[number]"""
+        if not isinstance(rel_types, int):
+            rel_types = self.mask(rel_types)
+        offsets, targets = self._adjacency(rel_types)
+        seen = bytearray(len(self.ids))
+        nodes = array("I")
+        distances = array("I")
+        origins = array("I")
+        for i, seed in enumerate(seeds):
+            node = self.node(seed)
+            if not seen[node]:
+                seen[node] = 1
+                nodes.append(node)
+                distances.append(0)
+                origins.append(i)
+        start = 0
+        for hop in range(1, hops + 1):
+            end = len(nodes)
+            for position in range(start, end):
+                node = nodes[position]
+                for target in targets[offsets[node]:offsets[node + 1]]:
+                    if not seen[target]:
+                        seen[target] = 1
+                        nodes.append(target)
+                        distances.append(hop)
+                        origins.append(origins[position])
+            if len(nodes) == end:
+                break
+            start = end
+        return nodes, distances, origins
+
+
+def normalize_form(written_form):
+    """The key of a written form in the LemmaIndex: case-folded, with
+    underscores as spaces"""
+    return written_form.casefold().replace("_", " ")
+
+
+class LemmaIndex:
+    """Finds the entries with a lemma or form matching a surface form,
+    ignoring case and whether words are separated by spaces or underscores.
+
+    Each key maps to a tuple of ints, each packing the number of an entry
+    with the part of speech of its lemma"""
+
+    pos_list = list(PartOfSpeech)
+    pos_bits = 4
+
+    def __init__(self, wn):
+        self.entry_ids = [entry.id for entry in wn.entries]
+        pos_codes = {pos: code for code, pos in enumerate(self.pos_list)}
+        keys = {}
+        for number, entry in enumerate(wn.entries):
+            packed = ((number << self.pos_bits)
+                      | pos_codes[entry.lemma.part_of_speech])
+            forms = [entry.lemma.written_form]
+            forms.extend(form.written_form for form in entry.forms)
+            for form in forms:
+                key = normalize_form(form)
+                if key not in keys:
+                    keys[key] = [packed]
+                elif keys[key][-1] != packed:
+                    keys[key].append(packed)
+        self.keys = {key: tuple(packed) for key, packed in keys.items()}
+
+    def _pos_mask(self, pos):
+        # The set of POS codes to keep, where the adjectives include the
+        # satellites
+        if pos is None:
+            return None
+        if isinstance(pos, str):
+            pos = PartOfSpeech(pos)
+        if pos == PartOfSpeech.ADJECTIVE:
+            return {self.pos_list.index(PartOfSpeech.ADJECTIVE),
+                    self.pos_list.index(PartOfSpeech.ADJECTIVE_SATELLITE)}
+        return {self.pos_list.index(pos)}
+
+    def _unpack(self, packed, mask):
+        mask_bits = (1 << self.pos_bits) - 1
+        return [(self.entry_ids[p >> self.pos_bits],
+                 self.pos_list[p & mask_bits])
+                for p in packed if mask is None or p & mask_bits in mask]
+
+    def lookup(self, written_form, pos=None):
+        """The IDs and parts of speech of the entries with the form as their
+        lemma or one of their forms, optionally only those of a part of
+        speech (a PartOfSpeech or its letter)"""
+        packed = self.keys.get(normalize_form(written_form))
+        if not packed:
+            return []
+        return self._unpack(packed, self._pos_mask(pos))
+
+    def lookup_all(self, written_forms, pos=None):
+        """lookup() for each of a list of forms, such as the tokens of a
+        text, looking up each distinct form only once"""
+        mask = self._pos_mask(pos)
+        results = {}
+        found = []
+        for written_form in written_forms:
+            result = results.get(written_form)
+            if result is None:
+                packed = self.keys.get(normalize_form(written_form))
+                result = self._unpack(packed, mask) if packed else []
+                results[written_form] = result
+            found.append(result)
+        return found
+
+
+def edit_distance(a, b, limit):
+    """The Levenshtein distance between two strings, or limit + 1 if it is
+    more than limit"""
+    # A common prefix or suffix does not change the distance, and only the
+    # cells within limit of the diagonal can be within the limit
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while (end < len(a) - start and end < len(b) - start
+           and a[-1 - end] == b[-1 - end]):
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    if not a or not b:
+        return max(len(a), len(b))
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[low - 1]
+        for j in range(low, high + 1):
+            d = min(previous[j] + 1, current[j - 1] + 1,
+                    previous[j - 1] + (ca != b[j - 1]))
+            if d > over:
+                d = over
+            current[j] = d
+            if d < best:
+                best = d
+        if best > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+def deletes(text, distance):
+    """The strings made by deleting up to distance characters"""
+    found = {text}
+    last = [text]
+    for _ in range(distance):
+        shorter = []
+        for t in last:
+            for i in range(len(t)):
+                d = t[:i] + t[i + 1:]
+                if d not in found:
+                    found.add(d)
+                    shorter.append(d)
+        last = shorter
+    return found
+
+
+class LemmaSearch:
+    """Prefix and typo-tolerant search over the lemmas and forms of a
+    lexicon, with keys normalised as in the LemmaIndex.
+
+    The keys are kept in a sorted list, so the keys with a prefix are the
+    range found by bisection. Fuzzy search uses symmetric deletes (as in
+    SymSpell): each key is listed under every string made by deleting up to
+    max_distance characters from its first prefix_length characters. Two
+    strings within the edit distance have prefixes with such a deletion in
+    common, so the keys listed under the deletions of the prefix of a query
+    are the only candidates, and these are checked with edit_distance"""
+
+    def __init__(self, wn, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        forms = {}
+        for entry in wn.entries:
+            for form in [entry.lemma] + entry.forms:
+                key = normalize_form(form.written_form)
+                if key not in forms:
+                    forms[key] = [form.written_form]
+                elif form.written_form not in forms[key]:
+                    forms[key].append(form.written_form)
+        self.keys = sorted(forms)
+        self.written_forms = [tuple(forms[key]) for key in self.keys]
+        self._index_deletes()
+
+    def _index_deletes(self):
+        self.deletes = {}
+        for number, key in enumerate(self.keys):
+            for d in deletes(key[:self.prefix_length], self.max_distance):
+                numbers = self.deletes.get(d)
+                if numbers is None:
+                    self.deletes[d] = number
+                elif isinstance(numbers, int):
+                    self.deletes[d] = [numbers, number]
+                else:
+                    numbers.append(number)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        # Collecting garbage while the many small lists are unpickled would
+        # take longer than the loading itself
+        gc.disable()
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        finally:
+            gc.enable()
+
+    def prefix(self, prefix, limit=10):
+        """The written forms starting with a prefix (in the order of their
+        keys), at most limit of them unless limit is None"""
+        prefix = normalize_form(prefix)
+        found = []
+        for number in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[number].startswith(prefix):
+                break
+            found.extend(self.written_forms[number])
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+        return found
+
+    def fuzzy(self, written_form, max_distance=None, limit=10):
+        """The written forms within an edit distance (at most the
+        max_distance the index was built with) of a form, as (written form,
+        distance) pairs, closest first"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        query = normalize_form(written_form)
+        candidates = set()
+        for d in deletes(query[:self.prefix_length], max_distance):
+            numbers = self.deletes.get(d)
+            if numbers is None:
+                continue
+            if isinstance(numbers, int):
+                candidates.add(numbers)
+            else:
+                candidates.update(numbers)
+        matches = []
+        for number in candidates:
+            key = self.keys[number]
+            if abs(len(key) - len(query)) > max_distance:
+                continue
+            distance = edit_distance(query, key, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, key, number))
+        matches.sort()
+        found = [(written, distance) for distance, _, number in matches
+                 for written in self.written_forms[number]]
+        return found if limit is None else found[:limit]
+
+
+class QueryCache:
+    """A least-recently-used cache of the results of lemma lookups,
+    ancestor queries and expansions, with the indexes answering them built
+    when first needed. The results returned are shared between callers and
+    must not be modified.
+
+    Changes to the lexicon clear the results and indexes, so the next query
+    rebuilds them, if they are made through a change_manager.ChangeList
+    that the cache listens to, e.g.,
+
+        change_list.listeners.append(cache.invalidate)"""
+
+    def __init__(self, wn, maxsize=100000):
+        self.wn = wn
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.indexes = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def index(self, index_class):
+        """The LemmaIndex, HypernymIndex or RelationGraph of the lexicon"""
+        if index_class not in self.indexes:
+            self.indexes[index_class] = index_class(self.wn)
+        return self.indexes[index_class]
+
+    def _get(self, key):
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    def _put(self, key, result):
+        self.results[key] = result
+        while len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+        return result
+
+    def lookup(self, written_form, pos=None):
+        """LemmaIndex.lookup"""
+        key = ("lookup", written_form, pos)
+        result = self._get(key)
+        if result is None:
+            result = self._put(key, self.index(LemmaIndex).lookup(
+                written_form, pos))
+        return result
+
+    def ancestors(self, synset_id):
+        """HypernymIndex.ancestors"""
+        key = ("ancestors", synset_id)
+        result = self._get(key)
+        if result is None:
+            result = self._put(key, self.index(HypernymIndex).ancestors(
+                synset_id))
+        return result
+
+    def expand(self, seeds, rel_types, hops=1):
+        """RelationGraph.expand"""
+        graph = self.index(RelationGraph)
+        if not isinstance(rel_types, int):
+            rel_types = graph.mask(rel_types)
+        key = ("expand", tuple(seeds), rel_types, hops)
+        result = self._get(key)
+        if result is None:
+            result = self._put(key, graph.expand(seeds, rel_types, hops))
+        return result
+
+    def invalidate(self):
+        """Forget all results and indexes after the lexicon has changed"""
+        self.results.clear()
+        self.indexes = {}
+        self.invalidations += 1
+
+    def clear(self):
+        self.results.clear()
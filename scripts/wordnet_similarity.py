@@ -0,0 +1,376 @@
+"""Similarity of synsets in the hypernym hierarchy: path, Leacock-Chodorow
+and Wu-Palmer similarity, and Resnik, Lin and Jiang-Conrath similarity from
+the intrinsic information content of each synset, computed as in NLTK
+(without its simulated root for verbs), e.g.,
+
+    hypernyms = wordnet_query.HypernymIndex(wn)
+    similarity = SimilarityIndex(hypernyms, load_ic(hypernyms))
+    similarity.wup_similarity("oewn-02086723-n", "oewn-02124272-n")
+
+Scoring many pairs at once with similarities() is vectorised if NumPy is
+installed.
+"""
+from collections import Counter
+import hashlib
+import math
+import os
+import pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The Jiang-Conrath similarity of synsets with the same information content
+JCN_INFINITY = 1e300
+
+
+def intrinsic_ic(hypernyms):
+    """The intrinsic information content of each synset (by number) as in
+    Seco et al. (2004): 1 - log(hyponyms + 1) / log(synsets), where hyponyms
+    counts the hyponyms of the synset, direct or not, and synsets is the
+    number of synsets of its part of speech"""
+    sizes = Counter(synset_id[-1] for synset_id in hypernyms.ids)
+    ic = []
+    for node, synset_id in enumerate(hypernyms.ids):
+        size = sizes[synset_id[-1]]
+        if size < 2:
+            ic.append(1.0)
+            continue
+        hyponyms = hypernyms._descendant_count(node)
+        ic.append(max(0.0, 1.0 - math.log(hyponyms + 1) / math.log(size)))
+    return ic
+
+
+def hierarchy_digest(hypernyms):
+    """A digest of the synsets and hypernym links of a HypernymIndex, which
+    is all the intrinsic information content depends on"""
+    return hashlib.sha1(pickle.dumps((hypernyms.ids, hypernyms.parents),
+                                     pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def load_ic(hypernyms, cache="wn-ic.pickle"):
+    """The intrinsic information content of each synset, read from the cache
+    if it was computed for the same hierarchy (however the lexicon was
+    loaded or edited), or else computed and written to the cache"""
+    digest = hierarchy_digest(hypernyms)
+    if os.path.exists(cache):
+        with open(cache, "rb") as f:
+            cached = pickle.load(f)
+        if isinstance(cached, tuple) and cached[0] == digest:
+            return cached[1]
+    ic = intrinsic_ic(hypernyms)
+    with open(cache, "wb") as f:
+        pickle.dump((digest, ic), f, pickle.HIGHEST_PROTOCOL)
+    return ic
+
+
+class SimilarityIndex:
+    """Finds the lowest common hypernym of two synsets and the shortest path
+    between them through it.
+
+    Most synsets have only one hypernym, as do all of their ancestors, so
+    their ancestors form a tree. For two such synsets the lowest common
+    hypernym is found by binary lifting on the tree and the path follows it.
+    If either synset has an ancestor (or is itself) with several hypernyms,
+    the distances up from each synset to all of its ancestors are used
+    instead. These are kept for the most recent synsets.
+
+    The information content of each synset (by number) is computed with
+    intrinsic_ic unless given"""
+
+    def __init__(self, hypernyms, ic=None, cache_size=100000):
+        self.hypernyms = hypernyms
+        self.ic = ic if ic is not None else intrinsic_ic(hypernyms)
+        parents = hypernyms.parents
+        n = len(hypernyms.ids)
+        # In topological order, so the hypernyms of a synset come first
+        order = list(range(n))
+        order.sort(key=lambda node: hypernyms.max_depths[node])
+        self.multiple = [False] * n
+        tree_parent = [-1] * n
+        for node in order:
+            if len(parents[node]) > 1 or any(
+                    self.multiple[p] for p in parents[node]):
+                self.multiple[node] = True
+            elif parents[node]:
+                tree_parent[node] = parents[node][0]
+        # The 2^k-th tree ancestor of each synset, or -1
+        self.lift = [tree_parent]
+        for _ in range(max(1, max(hypernyms.max_depths).bit_length())):
+            last = self.lift[-1]
+            self.lift.append([last[a] if a >= 0 else -1 for a in last])
+        # The depth of the deepest synset of each part of speech
+        self.taxonomy_depths = {}
+        for node, synset_id in enumerate(hypernyms.ids):
+            pos = synset_id[-1]
+            self.taxonomy_depths[pos] = max(
+                self.taxonomy_depths.get(pos, 0), hypernyms.max_depths[node])
+        self.cache_size = cache_size
+        self.distances = {}
+        if numpy is not None:
+            self._arrays()
+
+    def _arrays(self):
+        # The tables as arrays for similarities(), with the missing
+        # ancestor -1 as an extra synset that is its own ancestor
+        n = len(self.hypernyms.ids)
+        self.np_lift = numpy.array([lift + [-1] for lift in self.lift])
+        self.np_lift[self.np_lift < 0] = n
+        self.np_multiple = numpy.array(self.multiple + [True])
+        self.np_min_depths = numpy.array(self.hypernyms.min_depths + [0])
+        self.np_max_depths = numpy.array(self.hypernyms.max_depths + [0])
+        self.np_ic = numpy.array(list(self.ic) + [0.0])
+        pos = sorted(self.taxonomy_depths)
+        self.np_pos = numpy.array(
+            [pos.index(synset_id[-1]) for synset_id in self.hypernyms.ids]
+            + [-1])
+        self.np_taxonomy_depths = numpy.array(
+            [self.taxonomy_depths[p] for p in pos])
+
+    def _tree_lca(self, x, y):
+        depths = self.hypernyms.min_depths
+        if depths[x] < depths[y]:
+            x, y = y, x
+        diff = depths[x] - depths[y]
+        k = 0
+        while diff:
+            if diff & 1:
+                x = self.lift[k][x]
+            diff >>= 1
+            k += 1
+        if x == y:
+            return x
+        for k in reversed(range(len(self.lift))):
+            if self.lift[k][x] != self.lift[k][y]:
+                x = self.lift[k][x]
+                y = self.lift[k][y]
+        x = self.lift[0][x]
+        return x if x == self.lift[0][y] else -1
+
+    def _up_distances(self, node):
+        """The shortest distance up from a synset to itself and each of its
+        ancestors"""
+        if node in self.distances:
+            return self.distances[node]
+        distances = {node: 0}
+        frontier = [node]
+        while frontier:
+            next_frontier = []
+            for n in frontier:
+                for p in self.hypernyms.parents[n]:
+                    if p not in distances:
+                        distances[p] = distances[n] + 1
+                        next_frontier.append(p)
+            frontier = next_frontier
+        if len(self.distances) >= self.cache_size:
+            self.distances.clear()
+        self.distances[node] = distances
+        return distances
+
+    def _common(self, x, y):
+        """The distances up from two synsets and their common hypernyms"""
+        dxs = self._up_distances(x)
+        dys = self._up_distances(y)
+        if len(dxs) > len(dys):
+            common = [c for c in dys if c in dxs]
+        else:
+            common = [c for c in dxs if c in dys]
+        return dxs, dys, common
+
+    def _compare(self, x, y):
+        """The length of the shortest path between two synsets through a
+        common hypernym, their lowest common hypernym (the deepest, by its
+        longest path from a root) and the distances up to it from each
+        synset. None if they have no common hypernym"""
+        if not self.multiple[x] and not self.multiple[y]:
+            lca = self._tree_lca(x, y)
+            if lca < 0:
+                return None
+            depths = self.hypernyms.min_depths
+            dx = depths[x] - depths[lca]
+            dy = depths[y] - depths[lca]
+            return dx + dy, lca, dx, dy
+        dxs, dys, common = self._common(x, y)
+        if not common:
+            return None
+        max_depths = self.hypernyms.max_depths
+        ids = self.hypernyms.ids
+        lcs = max(common, key=lambda c: (max_depths[c], ids[c]))
+        return (min(dxs[c] + dys[c] for c in common), lcs, dxs[lcs],
+                dys[lcs])
+
+    def _path(self, x, y):
+        result = self._compare(x, y)
+        if result is None:
+            return None
+        return 1.0 / (result[0] + 1)
+
+    def _lch(self, x, y):
+        pos = self.hypernyms.ids[x][-1]
+        if pos != self.hypernyms.ids[y][-1]:
+            return None
+        result = self._compare(x, y)
+        if result is None:
+            return None
+        return -math.log((result[0] + 1) /
+                         (2.0 * (self.taxonomy_depths[pos] + 1)))
+
+    def _wup(self, x, y):
+        result = self._compare(x, y)
+        if result is None:
+            return None
+        _, lcs, dx, dy = result
+        depth = self.hypernyms.max_depths[lcs] + 1
+        return 2.0 * depth / (dx + dy + 2 * depth)
+
+    def _most_informative(self, x, y):
+        """The common hypernym of two synsets with the highest information
+        content, or -1 if they have none. In the tree this is the lowest
+        one, as each synset has more hyponyms than any of its hyponyms"""
+        if not self.multiple[x] and not self.multiple[y]:
+            return self._tree_lca(x, y)
+        _, _, common = self._common(x, y)
+        if not common:
+            return -1
+        ids = self.hypernyms.ids
+        return max(common, key=lambda c: (self.ic[c], ids[c]))
+
+    def _res(self, x, y):
+        lcs = self._most_informative(x, y)
+        if lcs < 0:
+            return None
+        return self.ic[lcs]
+
+    def _lin(self, x, y):
+        lcs = self._most_informative(x, y)
+        if lcs < 0:
+            return None
+        if x == y:
+            return 1.0
+        return 2.0 * self.ic[lcs] / (self.ic[x] + self.ic[y])
+
+    def _jcn(self, x, y):
+        lcs = self._most_informative(x, y)
+        if lcs < 0:
+            return None
+        distance = self.ic[x] + self.ic[y] - 2.0 * self.ic[lcs]
+        if distance <= 0:
+            return JCN_INFINITY
+        return 1.0 / distance
+
+    def lowest_common_hypernym(self, synset_id1, synset_id2):
+        """The ID of the lowest common hypernym of two synsets (which may be
+        one of them), or None if they have none"""
+        number = self.hypernyms.number
+        result = self._compare(number[synset_id1], number[synset_id2])
+        if result is None:
+            return None
+        return self.hypernyms.ids[result[1]]
+
+    def path_similarity(self, synset_id1, synset_id2):
+        number = self.hypernyms.number
+        return self._path(number[synset_id1], number[synset_id2])
+
+    def lch_similarity(self, synset_id1, synset_id2):
+        """Leacock-Chodorow similarity, which is None for synsets of
+        different parts of speech"""
+        number = self.hypernyms.number
+        return self._lch(number[synset_id1], number[synset_id2])
+
+    def wup_similarity(self, synset_id1, synset_id2):
+        number = self.hypernyms.number
+        return self._wup(number[synset_id1], number[synset_id2])
+
+    def res_similarity(self, synset_id1, synset_id2):
+        """Resnik similarity, the information content of the most
+        informative common hypernym"""
+        number = self.hypernyms.number
+        return self._res(number[synset_id1], number[synset_id2])
+
+    def lin_similarity(self, synset_id1, synset_id2):
+        number = self.hypernyms.number
+        return self._lin(number[synset_id1], number[synset_id2])
+
+    def jcn_similarity(self, synset_id1, synset_id2):
+        """Jiang-Conrath similarity, which is JCN_INFINITY for synsets with
+        the same information content as their common hypernym"""
+        number = self.hypernyms.number
+        return self._jcn(number[synset_id1], number[synset_id2])
+
+    def similarities(self, pairs, measure="path"):
+        """Score many pairs of synset IDs at once with one of the measures
+        "path", "lch", "wup", "res", "lin" or "jcn". With NumPy, the pairs
+        in the tree are scored together, and otherwise the pairs are scored
+        grouped by their first synset so that its distances are only
+        computed once"""
+        score = {"path": self._path, "lch": self._lch, "wup": self._wup,
+                 "res": self._res, "lin": self._lin,
+                 "jcn": self._jcn}[measure]
+        number = self.hypernyms.number
+        nodes = [(number[a], number[b]) for a, b in pairs]
+        scores = [None] * len(nodes)
+        if numpy is not None and nodes:
+            xs = numpy.array([x for x, _ in nodes])
+            ys = numpy.array([y for _, y in nodes])
+            in_tree = ~(self.np_multiple[xs] | self.np_multiple[ys])
+            tree_scores = self._tree_scores(measure, xs[in_tree],
+                                            ys[in_tree])
+            for i, s in zip(numpy.flatnonzero(in_tree).tolist(),
+                            tree_scores):
+                scores[i] = s
+            rest = numpy.flatnonzero(~in_tree).tolist()
+        else:
+            rest = range(len(nodes))
+        for i in sorted(rest, key=lambda i: nodes[i][0]):
+            scores[i] = score(*nodes[i])
+        return scores
+
+    def _tree_scores(self, measure, xs, ys):
+        # _tree_lca and the measures for arrays of synsets in the tree
+        n = len(self.hypernyms.ids)
+        lift = self.np_lift
+        depths = self.np_min_depths
+        swap = depths[xs] < depths[ys]
+        x = numpy.where(swap, ys, xs)
+        y = numpy.where(swap, xs, ys)
+        diff = depths[x] - depths[y]
+        for k in range(len(lift)):
+            x = numpy.where((diff >> k) & 1, lift[k][x], x)
+        same = x == y
+        for k in reversed(range(len(lift))):
+            ax = lift[k][x]
+            ay = lift[k][y]
+            move = ax != ay
+            x = numpy.where(move, ax, x)
+            y = numpy.where(move, ay, y)
+        lca = numpy.where(same, x, numpy.where(
+            lift[0][x] == lift[0][y], lift[0][x], n))
+        found = lca < n
+        lca = numpy.where(found, lca, n)
+        dx = depths[xs] - depths[lca]
+        dy = depths[ys] - depths[lca]
+        ic = self.np_ic
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            if measure == "path":
+                scores = 1.0 / (dx + dy + 1)
+            elif measure == "lch":
+                pos = self.np_pos[xs]
+                found &= pos == self.np_pos[ys]
+                scores = -numpy.log((dx + dy + 1) / (
+                    2.0 * (self.np_taxonomy_depths[pos] + 1)))
+            elif measure == "wup":
+                depth = self.np_max_depths[lca] + 1
+                scores = 2.0 * depth / (dx + dy + 2 * depth)
+            elif measure == "res":
+                scores = ic[lca]
+            elif measure == "lin":
+                scores = numpy.where(
+                    xs == ys, 1.0,
+                    2.0 * ic[lca] / (ic[xs] + ic[ys]))
+            else:
+                distance = ic[xs] + ic[ys] - 2.0 * ic[lca]
+                scores = numpy.where(distance <= 0, JCN_INFINITY,
+                                     1.0 / distance)
+        return [s if f else None
+                for s, f in zip(scores.tolist(), found.tolist())]
@@ -0,0 +1,199 @@
+"""Full-text search over the definitions and examples of the synsets of a
+lexicon, ranked with BM25, e.g.,
+
+    index = TextIndex(wn)
+    index.search("domesticated animal that barks")
+    index.save("wn-text.pickle")
+
+The index can be kept up to date while editing by passing it to the
+update_def, add_ex and delete_ex functions of change_manager.
+"""
+from array import array
+from collections import Counter, defaultdict
+from itertools import accumulate
+import gc
+import heapq
+import math
+import pickle
+import re
+
+token_re = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """The case-folded words of a text"""
+    return token_re.findall(text.casefold())
+
+
+def synset_text(synset):
+    """The text of a synset that is indexed: its definitions and examples"""
+    return " ".join([d.text for d in synset.definitions]
+                    + [e.text for e in synset.examples])
+
+
+def compress(numbers):
+    """An array of non-negative ints with the smallest item size that holds
+    all of them"""
+    top = max(numbers, default=0)
+    for typecode in "BHIQ":
+        if top < 1 << (8 * array(typecode).itemsize):
+            return array(typecode, numbers)
+
+
+class TextIndex:
+    """An inverted index from the words of the definitions and examples to
+    the synsets they occur in, where each synset is one document.
+
+    The postings of a word are two compressed arrays: the gaps between the
+    numbers of the synsets it occurs in and its frequency in each. Updating
+    a synset does not rewrite these. Its postings are marked stale and its
+    new words kept in a small uncompressed index of updates, which is merged
+    into the postings by compact() (and so by save())"""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, wn):
+        self.ids = [synset.id for synset in wn.synsets]
+        self.number = {synset_id: i for i, synset_id in enumerate(self.ids)}
+        self.lengths = array("I")
+        postings = {}
+        for number, synset in enumerate(wn.synsets):
+            words = tokenize(synset_text(synset))
+            self.lengths.append(len(words))
+            for word, tf in Counter(words).items():
+                if word not in postings:
+                    postings[word] = ([], [])
+                numbers, tfs = postings[word]
+                numbers.append(number)
+                tfs.append(tf)
+        self.total_length = sum(self.lengths)
+        # The number of synsets indexed and not removed, for the IDF
+        self.documents = len(self.ids)
+        self.postings = {word: self._encode(numbers, tfs)
+                         for word, (numbers, tfs) in postings.items()}
+        self.stale = set()
+        self.removed = set()
+        self.updates = {}
+        self.update_words = {}
+        self.norms = None
+
+    @staticmethod
+    def _encode(numbers, tfs):
+        gaps = [b - a for a, b in zip([0] + numbers, numbers)]
+        return compress(gaps), compress(tfs)
+
+    def _postings(self, word):
+        """The numbers of the synsets containing a word and its frequency
+        in each, taking the updates into account"""
+        found = {}
+        if word in self.postings:
+            gaps, tfs = self.postings[word]
+            found = dict(zip(accumulate(gaps), tfs))
+            for number in self.stale.intersection(found):
+                del found[number]
+        found.update(self.updates.get(word, ()))
+        return found
+
+    def _norms(self):
+        # The length normalisation of each synset, which changes with the
+        # average length whenever a synset is updated
+        if self.norms is None:
+            # Any positive length will do when no synset has any text
+            average_length = self.total_length / max(1, self.documents) or 1
+            self.norms = [self.k1 * (1 - self.b + self.b * length
+                                     / average_length)
+                          for length in self.lengths]
+        return self.norms
+
+    def update_synset(self, synset):
+        """Reindex the definitions and examples of a (possibly new) synset"""
+        number = self.number.get(synset.id)
+        if number is None:
+            number = len(self.ids)
+            self.ids.append(synset.id)
+            self.number[synset.id] = number
+            self.lengths.append(0)
+            self.documents += 1
+        elif number in self.removed:
+            self.removed.discard(number)
+            self.documents += 1
+        self._remove(number)
+        words = tokenize(synset_text(synset))
+        self.lengths[number] = len(words)
+        self.total_length += len(words)
+        counts = Counter(words)
+        for word, tf in counts.items():
+            self.updates.setdefault(word, {})[number] = tf
+        self.update_words[number] = set(counts)
+
+    def remove_synset(self, synset_id):
+        """Remove a deleted synset from the index"""
+        number = self.number.get(synset_id)
+        if number is not None and number not in self.removed:
+            self._remove(number)
+            self.lengths[number] = 0
+            self.removed.add(number)
+            self.documents -= 1
+
+    def _remove(self, number):
+        self.norms = None
+        self.stale.add(number)
+        self.total_length -= self.lengths[number]
+        for word in self.update_words.pop(number, ()):
+            del self.updates[word][number]
+            if not self.updates[word]:
+                del self.updates[word]
+
+    def compact(self):
+        """Merge the updates into the compressed postings"""
+        words = set(self.updates)
+        if self.stale:
+            for word, (gaps, _) in self.postings.items():
+                if word not in words and not self.stale.isdisjoint(
+                        accumulate(gaps)):
+                    words.add(word)
+        for word in words:
+            found = sorted(self._postings(word).items())
+            if found:
+                self.postings[word] = self._encode(
+                    [number for number, _ in found], [tf for _, tf in found])
+            elif word in self.postings:
+                del self.postings[word]
+        self.stale = set()
+        self.updates = {}
+        self.update_words = {}
+
+    def search(self, query, limit=10):
+        """The IDs of the synsets best matching a query, with their BM25
+        scores, best first"""
+        documents = self.documents
+        norms = self._norms()
+        scores = defaultdict(float)
+        for word in set(tokenize(query)):
+            found = self._postings(word)
+            if not found:
+                continue
+            idf = math.log(1 + (documents - len(found) + 0.5)
+                           / (len(found) + 0.5))
+            weight = idf * (self.k1 + 1)
+            for number, tf in found.items():
+                scores[number] += weight * tf / (tf + norms[number])
+        best = heapq.nlargest(limit, scores.items(),
+                              key=lambda item: (item[1], -item[0]))
+        return [(self.ids[number], score) for number, score in best]
+
+    def save(self, path):
+        self.compact()
+        self.norms = None
+        with open(path, "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        gc.disable()
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        finally:
+            gc.enable()
@@ -69,6 +69,12 @@ def pronunciation_from_yaml(props):
     return [Pronunciation(p["value"], p.get("variety")) for p in props.get("pronunciation",[])]
 
 def synset_from_yaml(wn, props, id, lex_name):
+    ss = bare_synset_from_yaml(props, id, lex_name)
+    ss.members = [entry_for_synset(wn, ss, lemma) for lemma in props["members"]]
+    return ss
+
+def bare_synset_from_yaml(props, id, lex_name):
+    """Read a synset from YAML without resolving its members"""
     if "partOfSpeech" not in props:
         print(props)
     ss = Synset("oewn-" + id,
@@ -91,9 +97,29 @@ def synset_from_yaml(wn, props, id, lex_name):
             for target in targets:
                 ss.add_synset_relation(SynsetRelation(
                     "oewn-" + target, SynsetRelType(rel)))
-    ss.members = [entry_for_synset(wn, ss, lemma) for lemma in props["members"]]
     return ss
 
+def entry_from_yaml(lemma, pos, props):
+    entry = LexicalEntry(
+        "oewn-%s-%s" % (escape_lemma(lemma), pos))
+    entry.set_lemma(Lemma(lemma, PartOfSpeech(pos[:1])))
+    if "form" in props:
+        for form in props["form"]:
+            entry.add_form(Form(form))
+    for n, sense in enumerate(props["sense"]):
+        entry.add_sense(sense_from_yaml(sense, lemma, pos, n))
+    entry.pronunciation = pronunciation_from_yaml(props)
+    return entry
+
+def entries_from_yaml_file(f):
+    """Read all the entries in one entries-*.yaml file"""
+    with open(f, encoding="utf-8") as inp:
+        y = yaml.load(inp, Loader=CLoader)
+
+    for lemma, pos_map in y.items():
+        for pos, props in pos_map.items():
+            yield entry_from_yaml(lemma, pos, props)
+
 def entry_for_synset(wn, ss, lemma):
     for e in wn.entry_by_lemma(lemma):
         for s in wn.entry_by_id(e).senses:
@@ -132,31 +158,26 @@ def fix_synset_rels(wn, synset):
                                    inverse_synset_rels[rel.rel_type]))
 
 
-def load():
-    wn = Lexicon("oewn", "Engish WordNet", "en",
-                 "english-wordnet@googlegroups.com",
-                 "https://creativecommons.org/licenses/by/4.0",
-                 "2021",
-                 "https://github.com/globalwordnet/english-wordnet")
+def new_lexicon():
+    return Lexicon("oewn", "Engish WordNet", "en",
+                   "english-wordnet@googlegroups.com",
+                   "https://creativecommons.org/licenses/by/4.0",
+                   "2021",
+                   "https://github.com/globalwordnet/english-wordnet")
+
+
+def load_frames():
     with open("src/yaml/frames.yaml", encoding="utf-8") as inp:
         frames = yaml.load(inp, Loader=CLoader)
-        wn.frames = [SyntacticBehaviour(k,v) for k,v in frames.items()]
-    for f in glob("src/yaml/entries-*.yaml"):
-        with open(f, encoding="utf-8") as inp:
-            y = yaml.load(inp, Loader=CLoader)
+        return [SyntacticBehaviour(k,v) for k,v in frames.items()]
 
-            for lemma, pos_map in y.items():
-                for pos, props in pos_map.items():
-                    entry = LexicalEntry(
-                        "oewn-%s-%s" % (escape_lemma(lemma), pos))
-                    entry.set_lemma(Lemma(lemma, PartOfSpeech(pos[:1])))
-                    if "form" in props:
-                        for form in props["form"]:
-                            entry.add_form(Form(form))
-                    for n, sense in enumerate(props["sense"]):
-                        entry.add_sense(sense_from_yaml(sense, lemma, pos, n))
-                    entry.pronunciation = pronunciation_from_yaml(props)
-                    wn.add_entry(entry)
+
+def load():
+    wn = new_lexicon()
+    wn.frames = load_frames()
+    for f in glob("src/yaml/entries-*.yaml"):
+        for entry in entries_from_yaml_file(f):
+            wn.add_entry(entry)
 
     for f in glob("src/yaml/*.yaml"):
         lex_name = f[9:-5]
@@ -171,12 +192,18 @@ def load():
     # This is a big hack because of some inconsistencies in the XML that should
     # be gone soon
     synset_ids_starting_from_zero = set()
+    # The entry IDs of each XML lexfile and its sense IDs by all but their
+    # last two characters, read in the same pass so each is parsed once
+    xml_ids = {}
     for f in glob("src/xml/*.xml"):
-        wn_lex = parse_wordnet(f)
+        wn_lex = parse_wordnet_cached(f)
         for entry in wn_lex.entries:
             for sense in entry.senses:
                 if sense.id.endswith("00"):
                     synset_ids_starting_from_zero.add(sense.synset)
+        xml_ids[f] = ({entry.id for entry in wn_lex.entries},
+                      {sense.id[:-2]: sense.id for entry in wn_lex.entries
+                       for sense in entry.senses})
 
     for entry in wn.entries:
         for sense in entry.senses:
@@ -195,12 +222,10 @@ def load():
         by_lex_name[synset.lex_name].add_synset(synset)
 
     for lex_name, wn2 in by_lex_name.items():
-        if os.path.exists("src/xml/wn-%s.xml" % lex_name):
-            wn_lex = parse_wordnet("src/xml/wn-%s.xml" % lex_name)
-            senseids = {
-                sense.id[:-2]: sense.id for entry in wn_lex.entries for sense in entry.senses}
+        if "src/xml/wn-%s.xml" % lex_name in xml_ids:
+            entry_ids, senseids = xml_ids["src/xml/wn-%s.xml" % lex_name]
             for entry in wn2.entries:
-                if wn_lex.entry_by_id(entry.id):
+                if entry.id in entry_ids:
                     # Fix the last ID, because it is not actually so
                     # predicatable in the XML
                     for sense in entry.senses:
@@ -209,6 +234,79 @@ def load():
     return wn
 
 
+def stream_xml(xml_file, part=True):
+    """Write the wordnet as XML directly from the YAML files, giving the same
+    result as load() followed by to_xml(). Each YAML file is read twice: the
+    first pass only keeps the indexes needed to resolve the members of
+    synsets and the inverse relations, the second writes the XML as each file
+    is decoded"""
+    entry_files = glob("src/yaml/entries-*.yaml")
+    synset_files = [f for f in glob("src/yaml/*.yaml")
+                    if "entries" not in f and "frames" not in f]
+
+    member_entries = {}
+    sense_inverses = defaultdict(list)
+    for f in entry_files:
+        for entry in entries_from_yaml_file(f):
+            for sense in entry.senses:
+                member_entries.setdefault(
+                    (entry.lemma.written_form, sense.synset), entry.id)
+                for rel in sense.sense_relations:
+                    if (rel.rel_type in inverse_sense_rels
+                            and inverse_sense_rels[rel.rel_type] != rel.rel_type):
+                        sense_inverses[rel.target].append(SenseRelation(
+                            sense.id, inverse_sense_rels[rel.rel_type]))
+
+    wn = new_lexicon()
+    wn.xml_header(xml_file, part)
+
+    for f in entry_files:
+        for entry in entries_from_yaml_file(f):
+            for sense in entry.senses:
+                for rel in sense_inverses.get(sense.id, []):
+                    if not any(sr for sr in sense.sense_relations
+                            if sr.rel_type == rel.rel_type and
+                                sr.target == rel.target):
+                        sense.add_sense_relation(rel)
+            entry.to_xml(xml_file, wn.comments)
+
+    synset_inverses = defaultdict(list)
+    for f in synset_files:
+        with open(f, encoding="utf-8") as inp:
+            y = yaml.load(inp, Loader=CLoader)
+        for id, props in y.items():
+            for rel, targets in props.items():
+                if rel in SynsetRelType._value2member_map_:
+                    rel_type = SynsetRelType(rel)
+                    if (rel_type in inverse_synset_rels
+                            and inverse_synset_rels[rel_type] != rel_type):
+                        for target in targets:
+                            synset_inverses["oewn-" + target].append(
+                                SynsetRelation("oewn-" + id,
+                                               inverse_synset_rels[rel_type]))
+
+    for f in synset_files:
+        lex_name = f[9:-5]
+        with open(f, encoding="utf-8") as inp:
+            y = yaml.load(inp, Loader=CLoader)
+        for id, props in y.items():
+            ss = bare_synset_from_yaml(props, id, lex_name)
+            ss.members = []
+            for lemma in props["members"]:
+                if (lemma, ss.id) not in member_entries:
+                    print("Could not find %s referring to %s" % (lemma, ss.id))
+                ss.members.append(member_entries.get((lemma, ss.id), ""))
+            for rel in synset_inverses.get(ss.id, []):
+                if not [sr for sr in ss.synset_relations if sr.target ==
+                        rel.target and sr.rel_type == rel.rel_type]:
+                    ss.add_synset_relation(rel)
+            ss.to_xml(xml_file, wn.comments)
+
+    for synbeh in load_frames():
+        synbeh.to_xml(xml_file)
+    wn.xml_footer(xml_file)
+
+
 def char_range(c1, c2):
     """Generates the characters from `c1` to `c2`, inclusive."""
     for c in range(ord(c1), ord(c2) + 1):